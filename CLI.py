@@ -1,34 +1,69 @@
 
 import argparse
-import getpass
 import os
 import sys
 from dataclasses import dataclass
-from datetime import datetime
-from functools import lru_cache
+from functools import cached_property, lru_cache
 from pathlib import Path
 from urllib.parse import urlparse, urlunparse, ParseResult
 
+__version__ = "0.2.0"
 
 _REPO__ENDPOINT = "MINT__REPO__ENDPOINT"
+_REPO__USER = "MINT__REPO__USER"
+_REPO__PASSWORD = "MINT__REPO__PASSWORD"
+_REPO__CONCURRENCY = "MINT__REPO__CONCURRENCY"
+_REPO__RPS = "MINT__REPO__RPS"
+_REPO__BULK_SIZE = "MINT__REPO__BULK_SIZE"
 _DC__API = "MINT__DATACITE__API"
 _DC__TOKEN = "MINT__DATACITE__TOKEN"
 _DC__PREFIX = "MINT__DATACITE__PREFIX"
 _AFFIL__NAME = "MINT__AFFIL__NAME"
 _AFFIL__ROR = "MINT__AFFIL__ROR"
+_RESOURCE_TYPES = "MINT__RESOURCE_TYPES"
+
+_CACHE__TTL = "MINT__CACHE__TTL"
+_CACHE__MAX_MB = "MINT__CACHE__MAX_MB"
 
 _BATCH__RPS = "MINT__BATCH__RPS"
 _BATCH__CONCURRENCY = "MINT__BATCH__CONCURRENCY"
 _BATCH__RETRYCOUNT = "MINT__BATCH__RETRYCOUNT"
+_BATCH__FETCH_CONCURRENCY = "MINT__BATCH__FETCH_CONCURRENCY"
+_BATCH__TRANSFORM_CONCURRENCY = "MINT__BATCH__TRANSFORM_CONCURRENCY"
+_BATCH__PATCH_CONCURRENCY = "MINT__BATCH__PATCH_CONCURRENCY"
+_METRICS__PORT = "MINT__METRICS__PORT"
 
 def _url_param(param: str) -> ParseResult:
     if "//" not in param:
         param = "//" + param
     return urlparse(param, scheme="https")
 
+def _shard_param(param: str) -> tuple[int, int]:
+    from shardRunner import parse_shard
+    try:
+        return parse_shard(param)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+def _since_param(param: str) -> str:
+    if param == "last":
+        return param
+    from datetime import datetime
+    try:
+        datetime.fromisoformat(param.replace("Z", "+00:00"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not an ISO timestamp or 'last': {param!r}") from None
+    return param
+
 @dataclass
 class ParsedArgs:
     repo_endpoint: ParseResult | None = None
+    repo_user: str | None = None
+    repo_password: str | None = None
+    ask_repo_password: bool = False
+    repo_concurrency: int = 2
+    repo_rps: float = 0.0
+    bulk_size: int = 0
     datacite_api: ParseResult | None = None
     datacite_token: str | None = None
     ask_datacite_token: bool = False
@@ -36,16 +71,37 @@ class ParsedArgs:
     prefix: str | None = None
     affiliation_name: str | None = None
     affiliation_ror: str | None = None
+    resource_types: Path | None = None
 
     rps: float = 5.0
     concurrency: int = 2
     retry_count: int = 3
+    fetch_concurrency: int = 0
+    transform_concurrency: int = 1
+    patch_concurrency: int = 0
+
+    no_cache: bool = False
+    no_index: bool = False
+    index_sync: bool = True
+    cache_ttl: float = 86400.0
+    cache_max_mb: int = 512
+
+    metrics_port: int = 0
 
     log_directory: Path = Path("./logs")
     run_directory: Path = Path("./runs")
     verbose: int = 0
 
     command: str | None = None
+    resume: str | None = None
+    archive: bool = False
+    shard: tuple[int, int] | None = None
+    since: str | None = None
+    from_run: str | None = None
+    dry_run: bool = False
+    workers: int = 0
+    run_id: str | None = None
+    output: Path | None = None
     data: Path | None = None
     additional_data: list[Path] | None = None
 
@@ -62,6 +118,18 @@ class ParsedArgs:
         return urlunparse(self.datacite_api[:2] + ("", "", None, None)).rstrip("/")
 
     @property
+    def cache_path(self) -> Path | None:
+        if self.no_cache:
+            return None
+        return self.run_directory / "item_cache.sqlite3"
+
+    @property
+    def index_path(self) -> Path | None:
+        if self.no_index:
+            return None
+        return self.run_directory / "doi_index.sqlite3"
+
+    @cached_property
     def data_location(self) -> dict[str, Path] | None:
         if self.data is None:
             return None
@@ -87,6 +155,7 @@ class ParsedArgs:
             prog="mintdoi",
             description="Batch mint DataCite DOIs from Open Repository/DSpace item UUID CSVs."
         )
+        parser.add_argument("--version", action="version", version=f"%(prog)s {__version__}")
         parser.add_argument("-v", "--verbose", action="count")
         parser.add_argument("--log-directory", type=Path, default=Path("./logs"))
         parser.add_argument("--run-directory", type=Path, default=Path("./runs"))
@@ -94,6 +163,17 @@ class ParsedArgs:
         g = parser.add_argument_group("Repository")
         g.add_argument("--repo-endpoint", type=_url_param,
                        help=f"Open Repository base url. Env: {_REPO__ENDPOINT}")
+        g.add_argument("--repo-user", type=str, help=f"Admin login. Env: {_REPO__USER}")
+        g.add_argument("--ask-repo-password", action="store_true",
+                       help=f"Prompt for admin password. Env alternative: {_REPO__PASSWORD}")
+        g.add_argument("--repo-concurrency", type=int,
+                       help=f"Max in-flight repository requests. Env: {_REPO__CONCURRENCY}")
+        g.add_argument("--repo-rps", type=float,
+                       help=f"Max repository requests/sec, adapted down on throttling (0 = no limit). "
+                            f"Env: {_REPO__RPS}")
+        g.add_argument("--bulk-size", type=int,
+                       help=f"Fetch items N at a time via discovery search (0 = one GET per item). "
+                            f"Env: {_REPO__BULK_SIZE}")
 
         g = parser.add_argument_group("DataCite")
         g.add_argument("--datacite-api", type=_url_param,
@@ -101,67 +181,212 @@ class ParsedArgs:
         g.add_argument("--ask-datacite-token", action="store_true",
                        help=f"Prompt for token. Env alternative: {_DC__TOKEN}")
         g.add_argument("--prefix", type=str, help=f"DOI prefix. Env: {_DC__PREFIX}")
+        g.add_argument("--resource-types", type=Path,
+                       help=f"TOML dc.type -> resourceTypeGeneral table (default: resource_types.toml). "
+                            f"Env: {_RESOURCE_TYPES}")
 
         g = parser.add_argument_group("Affiliation")
         g.add_argument("--affil-name", type=str, help=f"Env: {_AFFIL__NAME}")
         g.add_argument("--affil-ror", type=str, help=f"Env: {_AFFIL__ROR}")
 
+        g = parser.add_argument_group("Cache")
+        g.add_argument("--no-cache", action="store_true", help="Always fetch items from the repository")
+        g.add_argument("--cache-ttl", type=float,
+                       help=f"Seconds before a cached item is revalidated. Env: {_CACHE__TTL}")
+        g.add_argument("--cache-max-mb", type=int, help=f"Cache size limit. Env: {_CACHE__MAX_MB}")
+        g.add_argument("--no-index", action="store_true",
+                       help="Do not check (or update) the local index of existing DOIs before minting")
+        g.add_argument("--no-index-sync", dest="index_sync", action="store_false",
+                       help="Use the DOI index as it is, without updating it first")
+
         g = parser.add_argument_group("Batch")
-        g.add_argument("--rps", type=float, help=f"DataCite requests/sec. Env: {_BATCH__RPS}")
-        g.add_argument("--concurrency", type=int, help=f"Workers. Env: {_BATCH__CONCURRENCY}")
+        g.add_argument("--rps", type=float,
+                       help=f"Max DataCite requests/sec, adapted down on throttling. Env: {_BATCH__RPS}")
+        g.add_argument("--concurrency", type=int, help=f"DataCite minting workers. Env: {_BATCH__CONCURRENCY}")
+        g.add_argument("--fetch-concurrency", type=int,
+                       help=f"Item fetch workers (0 = --repo-concurrency). Env: {_BATCH__FETCH_CONCURRENCY}")
+        g.add_argument("--transform-concurrency", type=int,
+                       help=f"Transform workers. Env: {_BATCH__TRANSFORM_CONCURRENCY}")
+        g.add_argument("--patch-concurrency", type=int,
+                       help=f"Repository patch workers (0 = --repo-concurrency). Env: {_BATCH__PATCH_CONCURRENCY}")
         g.add_argument("--retry-count", type=int, help=f"Retries. Env: {_BATCH__RETRYCOUNT}")
 
-        commands = parser.add_subparsers(dest="command", metavar="command")
-        commands.add_parser("check", help="Check CSV + connectivity")
-        commands.add_parser("run", help="Transform + mint + patch")
+        g = parser.add_argument_group("Metrics")
+        g.add_argument("--metrics-port", type=int,
+                       help=f"Serve Prometheus metrics on http://127.0.0.1:PORT/metrics during a run. "
+                            f"Env: {_METRICS__PORT}")
 
-        # input data
-        parser.add_argument("data", type=Path, help="CSV file or directory containing CSVs")
-        parser.add_argument("additional_data", nargs="*", type=Path, help="More CSVs or dirs (optional)")
+        commands = parser.add_subparsers(dest="command", metavar="command")
+        check = commands.add_parser("check", help="Check CSV + connectivity")
+        run = commands.add_parser("run", help="Transform + mint + patch")
+        for p in (check, run):
+            # input data
+            p.add_argument("data", type=Path, help="CSV file or directory containing CSVs")
+            p.add_argument("additional_data", nargs="*", type=Path, help="More CSVs or dirs (optional)")
+        run.add_argument("--shard", type=_shard_param, metavar="I/N",
+                         help="Only process the items hashed to shard I of N, with 1/N of --rps/--repo-rps")
+        run.add_argument("--workers", type=int, metavar="N",
+                         help="Run N shards as local processes and merge their reports")
+        sync = commands.add_parser("sync", help="Mint DOIs for items deposited or changed since the last sync")
+        sync.add_argument("--since", type=_since_param, default="last", metavar="TIMESTAMP|last",
+                          help="Items modified at or after this ISO timestamp (default: where the last sync ended)")
+        for p in (run, sync):
+            p.add_argument("--resume", metavar="RUN_ID",
+                           help="Continue a previous run, skipping work its journal records as done")
+            p.add_argument("--archive", action="store_true",
+                           help="Also keep every DataCite payload and response in the run's artifact streams")
+        resync = commands.add_parser("resync", help="Update the DataCite metadata of minted items that changed")
+        publish = commands.add_parser("publish", help="Like resync, and make draft DOIs findable")
+        for p in (resync, publish):
+            p.add_argument("data", nargs="?", type=Path, help="CSV file or directory of item UUIDs")
+            p.add_argument("additional_data", nargs="*", type=Path, help="More CSVs or dirs (optional)")
+            p.add_argument("--run", dest="from_run", metavar="RUN_ID", help="The items a run minted")
+            p.add_argument("--dry-run", action="store_true", help="Only report what would change")
+        retry = commands.add_parser("retry-failed", help="Run the items a run failed on again")
+        retry.add_argument("run_id", metavar="RUN_ID")
+        commands.add_parser("index", help="Build or update the local index of existing DOIs")
+        export = commands.add_parser("export-reminders", help="Write the DOI reminder report of a run")
+        export.add_argument("run_id", metavar="RUN_ID")
+        export.add_argument("-o", "--output", type=Path, help="Report file (default: stdout)")
 
         return parser
 
 def main(argv: list[str] | None = None) -> int:
     args = ParsedArgs(
         repo_endpoint=_url_param(os.environ[_REPO__ENDPOINT]) if _REPO__ENDPOINT in os.environ else None,
+        repo_user=os.environ.get(_REPO__USER),
+        repo_password=os.environ.get(_REPO__PASSWORD),
+        repo_concurrency=int(os.environ.get(_REPO__CONCURRENCY, "2")),
+        repo_rps=float(os.environ.get(_REPO__RPS, "0")),
+        bulk_size=int(os.environ.get(_REPO__BULK_SIZE, "0")),
         datacite_api=_url_param(os.environ[_DC__API]) if _DC__API in os.environ else None,
         datacite_token=os.environ.get(_DC__TOKEN),
         prefix=os.environ.get(_DC__PREFIX),
         affiliation_name=os.environ.get(_AFFIL__NAME),
         affiliation_ror=os.environ.get(_AFFIL__ROR),
+        resource_types=Path(os.environ[_RESOURCE_TYPES]) if _RESOURCE_TYPES in os.environ else None,
+        cache_ttl=float(os.environ.get(_CACHE__TTL, "86400")),
+        cache_max_mb=int(os.environ.get(_CACHE__MAX_MB, "512")),
         rps=float(os.environ.get(_BATCH__RPS, "5")),
         concurrency=int(os.environ.get(_BATCH__CONCURRENCY, "2")),
         retry_count=int(os.environ.get(_BATCH__RETRYCOUNT, "3")),
+        fetch_concurrency=int(os.environ.get(_BATCH__FETCH_CONCURRENCY, "0")),
+        transform_concurrency=int(os.environ.get(_BATCH__TRANSFORM_CONCURRENCY, "1")),
+        patch_concurrency=int(os.environ.get(_BATCH__PATCH_CONCURRENCY, "0")),
+        metrics_port=int(os.environ.get(_METRICS__PORT, "0")),
     )
 
     parser = ParsedArgs.parser()
     args = parser.parse_args(argv, namespace=args)
 
     if args.ask_datacite_token and not args.datacite_token:
+        import getpass
         args.datacite_token = getpass.getpass("DataCite token: ").strip()
         if not args.datacite_token:
             print("DataCite token is required.", file=sys.stderr)
             return 2
 
-    if args.command in ("check", "run"):
+    if args.ask_repo_password and not args.repo_password:
+        import getpass
+        args.repo_password = getpass.getpass("Repository admin password: ")
+
+    if args.command in ("check", "run", "sync", "resync", "publish", "retry-failed"):
         if not args.repo_url or not args.datacite_base or not args.prefix:
             parser.print_usage()
             print("Missing required: repo-endpoint, datacite-api, prefix", file=sys.stderr)
             return 2
-        if not args.data_location:
+        if args.command in ("resync", "publish") and args.data is None:
+            if not args.from_run:
+                parser.print_usage()
+                print("Give CSV data, --run RUN_ID or both.", file=sys.stderr)
+                return 2
+        elif args.command not in ("sync", "retry-failed"):
+            try:
+                data_location = args.data_location
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                return 2
+            if not data_location:
+                parser.print_usage()
+                print("No readable CSV data provided.", file=sys.stderr)
+                return 2
+            # a file without the id column would otherwise only fail mid-run, after the files before it
+            from csvReader import check_column
+            try:
+                for p in data_location.values():
+                    check_column(str(p))
+            except ValueError as e:
+                print(e, file=sys.stderr)
+                return 2
+        for run_id in (args.resume, args.from_run, args.run_id):
+            if run_id and not (args.run_directory / run_id).is_dir():
+                print(f"No run {run_id!r} in {args.run_directory}", file=sys.stderr)
+                return 2
+        from resourceTypes import DEFAULT_PATH, ResourceTypeMap
+        try:
+            resource_types = ResourceTypeMap.load(args.resource_types or DEFAULT_PATH)
+        except (OSError, ValueError) as e:
+            print(f"Invalid resource type table: {e}", file=sys.stderr)
+            return 2
+
+    if args.command == "index":
+        if not args.repo_url or not args.datacite_base or not args.prefix:
             parser.print_usage()
-            print("No readable CSV data provided.", file=sys.stderr)
+            print("Missing required: repo-endpoint, datacite-api, prefix", file=sys.stderr)
             return 2
+        from doiIndex import run_index
+        return run_index(args)
 
-    if args.command == "check":
-        # TODO: call check logic (csv columns, uuid format, GET test, DataCite auth test)
-        print("OK (stub): check passed")
+    if args.command == "export-reminders":
+        run_dir = args.run_directory / args.run_id
+        if not run_dir.is_dir():
+            print(f"No run {args.run_id!r} in {args.run_directory}", file=sys.stderr)
+            return 2
+        from artifacts import export_reminders
+        out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            for line in export_reminders(run_dir):
+                print(line, file=out)
+        finally:
+            if args.output:
+                out.close()
         return 0
 
+    if args.command == "check":
+        from preflight import run_check
+        return run_check(args, resource_types)
+
+    if args.command in ("run", "sync", "retry-failed"):
+        if not (args.datacite_token and args.repo_user and args.repo_password):
+            parser.print_usage()
+            print("Missing required: datacite token, repo-user, repo password", file=sys.stderr)
+            return 2
+    if args.command in ("resync", "publish"):
+        if not args.datacite_token:
+            parser.print_usage()
+            print("Missing required: datacite token", file=sys.stderr)
+            return 2
+        from resyncRunner import run_resync
+        return run_resync(args, resource_types)
+
+    if args.command == "retry-failed":
+        from deadLetter import run_retry_failed
+        return run_retry_failed(args, resource_types)
+
+    if args.command == "sync":
+        from syncRunner import run_sync
+        return run_sync(args, resource_types)
+
     if args.command == "run":
-        # TODO: call pipeline batch runner
-        print("OK (stub): run started")
-        return 0
+        if args.shard and args.workers:
+            parser.print_usage()
+            print("--shard and --workers cannot be combined", file=sys.stderr)
+            return 2
+        if args.workers and args.workers > 1:
+            from shardRunner import run_workers
+            return run_workers(args)
+        from batchRunner import run_batch
+        return run_batch(args, resource_types)
 
     parser.print_usage()
     return 2
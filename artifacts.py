@@ -0,0 +1,111 @@
+import gzip
+import os
+import queue
+import threading
+import time
+import zlib
+from collections.abc import Iterator
+from pathlib import Path
+
+from jsonCodec import dumps, loads
+
+STREAMS = ("payloads", "responses", "patches", "reminders", "failed")
+
+
+def reminder_text(doi: str | None, url: str | None, orcids: list[str] | None = None) -> str:
+    text = f"Add {doi} to {url}"
+    if orcids:
+        text += " and add the following ORCID iD(s) to their corresponding author(s): " + ", ".join(orcids)
+    return text
+
+
+class ArtifactWriter:
+    """Run-scoped artifact streams: one gzipped JSONL file per stream in ``run_dir``.
+
+    ``write`` only enqueues; a background thread serializes, compresses and
+    writes records, and flushes + fsyncs every ``fsync_interval`` seconds and
+    on close. Each writer session (e.g. a resumed run) starts new files
+    ``<stream>.<session>.jsonl.gz`` so a crash can only truncate the tail of
+    its own session.
+    """
+
+    def __init__(self, run_dir: Path, streams: tuple[str, ...] = STREAMS, fsync_interval: float = 2.0):
+        run_dir.mkdir(parents=True, exist_ok=True)
+        self.run_dir = run_dir
+        self.streams = streams
+        self.fsync_interval = fsync_interval
+        self.session = max((_session(p) for p in run_dir.glob("*.jsonl.gz")), default=-1) + 1
+        self._queue: queue.Queue[tuple[str, dict] | None] = queue.Queue(maxsize=10_000)
+        self._files: dict[str, gzip.GzipFile] = {}
+        self._writer = threading.Thread(target=self._write_loop, name="artifact-writer", daemon=True)
+        self._writer.start()
+
+    def write(self, stream: str, record: dict) -> None:
+        if stream in self.streams:
+            self._queue.put((stream, record))
+
+    def _file(self, stream: str) -> gzip.GzipFile:
+        f = self._files.get(stream)
+        if f is None:
+            f = self._files[stream] = gzip.open(self.run_dir / f"{stream}.{self.session}.jsonl.gz", "wb")
+        return f
+
+    def _sync(self) -> None:
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileobj.fileno())
+
+    def _write_loop(self) -> None:
+        last_sync = time.monotonic()
+        while True:
+            try:
+                entry = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                entry = ()
+            if entry is None:
+                break
+            if entry:
+                stream, record = entry
+                self._file(stream).write(dumps(record) + b"\n")
+            if time.monotonic() - last_sync >= self.fsync_interval:
+                self._sync()
+                last_sync = time.monotonic()
+        self._sync()
+        for f in self._files.values():
+            f.close()
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._writer.join()
+
+
+def _session(path: Path) -> int:
+    try:
+        return int(path.name.split(".")[1])
+    except (IndexError, ValueError):
+        return -1
+
+
+def read_stream(run_dir: Path, stream: str) -> Iterator[dict]:
+    """Records of ``stream`` across all writer sessions (and shards of the run), oldest first per shard."""
+    for path in sorted(run_dir.glob(f"**/{stream}.*.jsonl.gz"), key=lambda p: (p.parent, _session(p))):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            try:
+                for line in f:
+                    try:
+                        yield loads(line)
+                    except ValueError:
+                        # a record cut short by a crash before its flush
+                        continue
+            except (EOFError, zlib.error, gzip.BadGzipFile):
+                # the session crashed before closing its file
+                continue
+
+
+def export_reminders(run_dir: Path) -> Iterator[str]:
+    """Consolidated reminder lines of a run, one per item (the latest record wins)."""
+    latest: dict[str, dict] = {}
+    for record in read_stream(run_dir, "reminders"):
+        latest[record["item"]] = record
+    for record in latest.values():
+        yield reminder_text(record["doi"], record["url"], record.get("orcids"))
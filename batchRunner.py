@@ -0,0 +1,500 @@
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, TypeVar
+
+import httpx
+
+from csvReader import stream_item_ids
+from deadLetter import KINDS, STREAM as FAILED_STREAM, classify_error, dead_letter
+from artifacts import STREAMS, ArtifactWriter, reminder_text
+from dataciteClient import DataCiteClient, MintedDoi
+from dataciteTransform import DataCiteConfig, item_doi, to_datacite, unmatched_orcids
+from doiIndex import DoiIndex, bare_doi, sync_index
+from getDataFromRepo import DSpaceSession, OpenRepositoryClient
+from itemCache import ItemCache
+from itemRecord import ItemRecord
+from metrics import ItemTracer, MetricsServer, RunMetrics
+from pipeline import Stage, StageStats
+from resourceTypes import ResourceTypeMap, report_unknown_types
+from runJournal import RunJournal
+from shardRunner import select_shard, shard_name
+from rateLimit import RateLimiters, RetryBudget, RetryScheduler
+
+if TYPE_CHECKING:
+    from CLI import ParsedArgs
+    from deadLetter import FailedItems
+    from syncRunner import NewItems
+
+T = TypeVar("T")
+
+
+@dataclass
+class ItemResult:
+    item_id: str
+    doi: str | None = None
+    url: str | None = None
+    orcids: list[str] = field(default_factory=list)
+    error: str | None = None
+    error_kind: str | None = None
+    latency: float = 0.0
+    existing: bool = False
+
+    @property
+    def reminder(self) -> str:
+        return reminder_text(self.doi, self.url, self.orcids)
+
+
+@dataclass
+class RunSummary:
+    minted: list[ItemResult] = field(default_factory=list)
+    failed: list[ItemResult] = field(default_factory=list)
+    existing: list[ItemResult] = field(default_factory=list)
+    skipped: int = 0
+    elapsed: float = 0.0
+    stages: dict[str, StageStats] = field(default_factory=dict)
+
+
+@dataclass
+class _Task:
+    result: ItemResult
+    record: ItemRecord | None = None
+    payload: dict | None = None
+    done: bool = False
+    # resumed from a journal that says "minted": the PATCH may have gone through already
+    resumed: bool = False
+    span: object = None
+    attempt: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+
+class BatchRunner:
+    """Fetch -> transform -> DataCite POST -> DSpace PATCH for many items at once.
+
+    Each step is a :class:`pipeline.Stage` with its own workers
+    (``fetch_concurrency`` and ``patch_concurrency`` default to
+    ``repo_concurrency``, ``concurrency`` is the number of DataCite minters)
+    and a bounded input queue, so the stages overlap and a slow service only
+    fills the queue in front of it instead of memory. Calls to each service go
+    through an AIMD rate limiter (DataCite capped at ``rps``, the repository
+    at ``repo_rps``; 0 means unlimited) and repository calls share a
+    semaphore of ``repo_concurrency`` in-flight requests. An item that fails
+    with a 429/5xx or connection error is put on a delayed-retry queue with
+    jittered backoff (honoring Retry-After) and goes back to the stage that
+    failed, up to ``retry_count`` times and within the shared retry budget.
+    With a ``journal`` every stage is checkpointed and items it already
+    records as patched are skipped; items minted but not patched only get the
+    PATCH. With ``artifacts`` each PATCH and reminder is added to the run's
+    streams. Items that already have a DOI (in their ``dc.identifier.doi`` or
+    in the ``index``) are not minted again; a DOI DataCite already has for the
+    item's landing page is patched into the item instead of minting a new one.
+    Retries stay idempotent: the DOI is derived from the item UUID, so a POST
+    whose response was lost is found again (DataCite answers the repeat with
+    422 "taken") rather than minting a second draft, and a retried or resumed
+    PATCH first checks that the item does not carry the DOI already.
+    ``metrics`` receives stage timings, retries and outcomes; ``tracer``
+    traces a sample of the items, one span per stage.
+    """
+
+    def __init__(
+        self,
+        repo: OpenRepositoryClient,
+        datacite: DataCiteClient,
+        config: DataCiteConfig,
+        *,
+        rps: float = 5.0,
+        repo_rps: float = 0.0,
+        concurrency: int = 2,
+        repo_concurrency: int = 2,
+        fetch_concurrency: int = 0,
+        transform_concurrency: int = 1,
+        patch_concurrency: int = 0,
+        retry_count: int = 3,
+        bulk_size: int = 0,
+        journal: RunJournal | None = None,
+        artifacts: ArtifactWriter | None = None,
+        index: DoiIndex | None = None,
+        metrics: RunMetrics | None = None,
+        tracer: ItemTracer | None = None,
+        limiters: RateLimiters | None = None,
+        retry_budget: RetryBudget | None = None,
+    ):
+        self.repo = repo
+        self.datacite = datacite
+        self.config = config
+        repo_concurrency = max(1, repo_concurrency)
+        self.workers = {
+            "fetch": fetch_concurrency or repo_concurrency,
+            "transform": transform_concurrency,
+            "mint": concurrency,
+            "patch": patch_concurrency or repo_concurrency,
+        }
+        self.bulk_size = bulk_size
+        self.journal = journal
+        self.artifacts = artifacts
+        self.index = index
+        self.metrics = metrics
+        self.tracer = tracer if tracer is not None and tracer.enabled else None
+        self.limiters = limiters or RateLimiters({"datacite": rps, "dspace": repo_rps})
+        self.retries = RetryScheduler(self.limiters, retry_count, retry_budget)
+        self.repo_slots = threading.BoundedSemaphore(repo_concurrency)
+        self.stages: dict[str, Stage[_Task]] = {}
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._started = time.monotonic()
+
+    def _repo_call(self, call: Callable[[], T]) -> T:
+        with self.repo_slots:
+            return self.retries.call("dspace", call)
+
+    def _datacite_call(self, call: Callable[[], T]) -> T:
+        return self.retries.call("datacite", call)
+
+    def _update_index(self, update: Callable[[], None]) -> None:
+        # the index only saves lookups; a locked database must not fail an item DataCite or DSpace took
+        try:
+            update()
+        except sqlite3.Error as e:
+            print(f"DOI index not updated: {e}", file=sys.stderr)
+
+    def _prefetch(self, item_ids: Iterable[str]) -> Iterator[tuple[str, ItemRecord | None]]:
+        if self.bulk_size <= 0:
+            yield from ((item_id, None) for item_id in item_ids)
+            return
+        for chunk in _chunks(item_ids, self.bulk_size):
+            try:
+                items = self._repo_call(lambda: self.repo.get_items_bulk(chunk, self.bulk_size))
+            except Exception as e:
+                print(f"bulk fetch failed, falling back to single GETs: {e}", file=sys.stderr)
+                items = {}
+            for item_id in chunk:
+                item = items.get(item_id)
+                yield item_id, ItemRecord.from_item(item, item_id) if item is not None else None
+
+    def _checkpoint(self, item_id: str, stage: str, **kwargs) -> None:
+        if self.journal is not None:
+            self.journal.record(item_id, stage, **kwargs)
+
+    def _fetch(self, task: _Task) -> None:
+        item_id = task.result.item_id
+        if task.record is None:
+            task.record = self._repo_call(lambda: self.repo.get_record(item_id))
+        self._checkpoint(item_id, "fetched")
+
+    def _transform(self, task: _Task) -> None:
+        metadata = task.record.metadata
+        doi = metadata.get("dc.identifier.doi")
+        if doi:
+            task.result.doi, task.result.existing, task.done = doi[0]["value"], True, True
+            if self.index is not None:
+                uri = metadata.get("dc.identifier.uri")
+                self._update_index(lambda: self.index.add_item(
+                    task.result.item_id, task.result.doi, uri[0]["value"] if uri else None, task.record.last_modified))
+            return
+        task.payload = to_datacite(metadata, self.config)
+        task.payload["data"]["attributes"]["doi"] = item_doi(self.config.prefix, task.result.item_id)
+        task.result.orcids = unmatched_orcids(metadata)
+        task.record = None
+        self._checkpoint(task.result.item_id, "transformed")
+
+    def _mint(self, task: _Task) -> None:
+        result = task.result
+        url = task.payload["data"]["attributes"]["url"]
+        existing = self.index.doi_for_url(url) if self.index is not None else None
+        if existing is not None:
+            result.doi, result.url, result.existing = existing, url, True
+        else:
+            doi = task.payload["data"]["attributes"]["doi"]
+            try:
+                minted = self._datacite_call(lambda: self.datacite.mint_draft(task.payload, result.item_id))
+            except httpx.HTTPStatusError as e:
+                # an earlier POST of this item went through (timed out, 5xx, interrupted run): keep its draft
+                if e.response.status_code != 422 or not self._minted_earlier(doi, url):
+                    raise
+                minted = MintedDoi(doi, url)
+            result.doi, result.url = minted.doi, minted.url
+        task.payload = None
+        # the DOI exists now: journal it before anything else can fail the item
+        self._checkpoint(result.item_id, "minted", doi=result.doi, url=result.url, durable=True)
+        if self.index is not None and not result.existing:
+            self._update_index(lambda: self.index.add_datacite(result.doi, result.url, "draft"))
+
+    def _minted_earlier(self, doi: str, url: str) -> bool:
+        try:
+            current = self._datacite_call(lambda: self.datacite.get_doi(doi))
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return False
+            raise
+        return current.get("url") == url
+
+    def _has_doi(self, task: _Task) -> bool:
+        if not (task.attempt or task.resumed):
+            return False
+        # "add" appends, so a PATCH that went through unanswered must not be sent again
+        record = self._repo_call(lambda: self.repo.get_record(task.result.item_id, fresh=True))
+        return any(bare_doi(v["value"]) == bare_doi(task.result.doi)
+                   for v in record.metadata.get("dc.identifier.doi", []))
+
+    def _patch(self, task: _Task) -> None:
+        result = task.result
+        patch = [{"op": "add", "path": "/metadata/dc.identifier.doi", "value": {"value": result.doi}}]
+        if not self._has_doi(task):
+            self._repo_call(lambda: self.repo.patch_item(result.item_id, patch))
+        self._checkpoint(result.item_id, "patched", durable=True)
+        if self.index is not None:
+            self._update_index(lambda: self.index.add_item(result.item_id, result.doi, result.url))
+        if self.artifacts is not None:
+            self.artifacts.write("patches", {"item": result.item_id, "operations": patch})
+            self.artifacts.write("reminders", {"item": result.item_id, "doi": result.doi, "url": result.url,
+                                               "orcids": result.orcids})
+
+    def _route(self, stage: Stage[_Task], task: _Task, error: Exception | None) -> None:
+        """Send ``task`` on to the next stage, back to ``stage`` after a delay, or to the summary."""
+        if error is None:
+            following = None if task.done else self._next.get(stage.name)
+            if following is not None:
+                following.put(task)
+                return
+        elif self.retries.can_retry(error, task.attempt):
+            task.attempt += 1
+            if self.metrics is not None:
+                self.metrics.retries.inc(stage=stage.name)
+            self.retries.schedule(stage, task, task.attempt, error)
+            return
+        else:
+            task.result.error = f"{type(error).__name__}: {error}"
+            task.result.error_kind = classify_error(stage.name, error)
+            if self.metrics is not None:
+                self.metrics.failures.inc(stage=stage.name, kind=task.result.error_kind)
+            if self.artifacts is not None:
+                metadata = task.record.metadata if task.record is not None else None
+                record = dead_letter(task.result.item_id, stage.name, error, task.attempt + 1,
+                                     task.result.doi, task.payload, metadata)
+                self.artifacts.write(FAILED_STREAM, record)
+        task.result.latency = time.monotonic() - task.started
+        if task.span is not None:
+            self.tracer.end_item(task.span, task.result.error, stage=stage.name, doi=task.result.doi,
+                                 attempts=task.attempt + 1)
+        self._finish(task.result)
+
+    def _finish(self, result: ItemResult) -> None:
+        summary = self._summary
+        outcome = "failed" if result.error else "existing" if result.existing else "minted"
+        if self.metrics is not None:
+            self.metrics.items.inc(outcome=outcome)
+        with self._cond:
+            getattr(summary, outcome).append(result)
+            if self._on_result is not None:
+                self._on_result(result)
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _submit(self, stage: Stage[_Task], task: _Task) -> None:
+        with self._cond:
+            self._in_flight += 1
+        if self.tracer is not None:
+            task.span = self.tracer.start_item(task.result.item_id)
+        stage.put(task)
+
+    def _traced(self, name: str, handler: Callable[[_Task], None]) -> Callable[[_Task], None]:
+        def traced(task: _Task) -> None:
+            with self.tracer.stage(task.span, name):
+                handler(task)
+        return traced
+
+    def stage_report(self) -> list[str]:
+        """One line of throughput and queue depth per stage, to spot the bottleneck."""
+        elapsed = time.monotonic() - self._started
+        return [stage.stats.describe(elapsed, stage.depth) for stage in self.stages.values()]
+
+    def run(self, item_ids: Iterable[str], on_result: Callable[[ItemResult], None] | None = None) -> RunSummary:
+        self._summary = summary = RunSummary()
+        self._on_result = on_result
+        self._started = time.monotonic()
+        observe = self.metrics.observe_stage if self.metrics is not None else None
+        self.stages = {
+            name: Stage(name, self._traced(name, handler) if self.tracer else handler, self._route,
+                        self.workers[name], observe=observe)
+            for name, handler in (("fetch", self._fetch), ("transform", self._transform),
+                                  ("mint", self._mint), ("patch", self._patch))
+        }
+        if self.metrics is not None:
+            self.metrics.queue_depth.collect = lambda: {(n,): s.depth for n, s in self.stages.items()}
+        order = list(self.stages.values())
+        self._next = {a.name: b for a, b in zip(order, order[1:])}
+        for stage in order:
+            stage.start()
+        self.retries.start()
+
+        def unfinished() -> Iterator[str]:
+            for item_id in item_ids:
+                state = self.journal.get(item_id) if self.journal is not None else None
+                doi = self.index.doi_for_item(item_id) if self.index is not None else None
+                if state is not None and state.reached("patched"):
+                    summary.skipped += 1
+                elif doi is not None:
+                    with self._cond:
+                        self._in_flight += 1
+                    self._finish(ItemResult(item_id, doi, existing=True))
+                elif state is not None and state.reached("minted"):
+                    self._submit(self.stages["patch"], _Task(ItemResult(item_id, state.doi, state.url), resumed=True))
+                else:
+                    yield item_id
+
+        try:
+            for item_id, record in self._prefetch(unfinished()):
+                self._submit(self.stages["fetch"], _Task(ItemResult(item_id), record))
+            with self._cond:
+                while self._in_flight:
+                    self._cond.wait()
+        finally:
+            self.retries.stop()
+            # upstream first, so every stage drains into one that is still running
+            for stage in order:
+                stage.stop()
+        summary.elapsed = time.monotonic() - self._started
+        summary.stages = {name: stage.stats for name, stage in self.stages.items()}
+        return summary
+
+
+def _chunks(items: Iterable[str], size: int) -> Iterator[list[str]]:
+    chunk: list[str] = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _report(result: ItemResult, verbose: int = 0) -> None:
+    if result.error:
+        print(f"{result.item_id}: FAILED ({result.error_kind}) {result.error}", file=sys.stderr)
+    elif verbose and result.existing and result.url is None:
+        print(f"{result.item_id}: already has DOI {result.doi}")
+    elif verbose:
+        print(result.reminder)
+
+
+def _progress(runner: BatchRunner, done: threading.Event, interval: float = 10.0) -> None:
+    while not done.wait(interval):
+        for line in runner.stage_report():
+            print(line, file=sys.stderr)
+
+
+def run_batch(args: "ParsedArgs", resource_types: ResourceTypeMap,
+              source: "NewItems | FailedItems | None" = None) -> int:
+    """Mint and patch the items of the CSVs in ``args.data``, or the items ``source`` lists.
+
+    ``source.item_ids(repo)`` gives the items once the repository session is
+    up; ``source.finish(summary)`` is called when the run is over.
+    """
+    cache = ItemCache(args.cache_path, ttl=args.cache_ttl, max_bytes=args.cache_max_mb * 1024 * 1024) \
+        if args.cache_path is not None else None
+    shard = shard_name(args.shard) if args.shard else None
+    journal = RunJournal.open(args.run_directory, args.resume, shard=shard)
+    print(f"run id: {journal.run_id}" + (f" ({shard})" if shard else ""), file=sys.stderr)
+    # shards share the rate budgets evenly
+    shards = args.shard[1] if args.shard else 1
+    repo = DSpaceSession(args.repo_url, args.repo_user, args.repo_password,
+                         max_connections=args.repo_concurrency, cache=cache)
+    artifacts = ArtifactWriter(journal.path.parent, streams=STREAMS if args.archive else ("patches", "reminders", FAILED_STREAM))
+    datacite = DataCiteClient(args.datacite_base, args.datacite_token,
+                              max_connections=args.concurrency, artifacts=artifacts)
+    index = DoiIndex(args.index_path) if args.index_path is not None else None
+    metrics = RunMetrics()
+    metrics.instrument(repo.client, "dspace")
+    metrics.instrument(datacite.client, "datacite")
+    server = MetricsServer(metrics, args.metrics_port).start() if args.metrics_port else None
+    if server is not None:
+        print(f"metrics: http://127.0.0.1:{server.server_address[1]}/metrics", file=sys.stderr)
+    try:
+        repo.login()
+        if index is not None and args.index_sync:
+            sync_index(index, repo, datacite, args.prefix)
+        runner = BatchRunner(
+            repo,
+            datacite,
+            DataCiteConfig(
+                prefix=args.prefix,
+                repository=args.repo_url,
+                affiliation_name=args.affiliation_name,
+                affiliation_ror=args.affiliation_ror,
+                resource_types=resource_types,
+            ),
+            rps=args.rps / shards,
+            repo_rps=args.repo_rps / shards,
+            concurrency=args.concurrency,
+            repo_concurrency=args.repo_concurrency,
+            fetch_concurrency=args.fetch_concurrency,
+            transform_concurrency=args.transform_concurrency,
+            patch_concurrency=args.patch_concurrency,
+            retry_count=args.retry_count,
+            bulk_size=args.bulk_size,
+            journal=journal,
+            artifacts=artifacts,
+            index=index,
+            metrics=metrics,
+            # -v traces a tenth of the items, -vv all of them
+            tracer=ItemTracer({0: 0.0, 1: 0.1}.get(args.verbose or 0, 1.0)),
+        )
+        if source is not None:
+            ids = source.item_ids(repo)
+        else:
+            ids = stream_item_ids(str(p) for p in args.data_location.values())
+        if args.shard:
+            ids = select_shard(ids, args.shard)
+        done = threading.Event()
+        if args.verbose:
+            threading.Thread(target=_progress, args=(runner, done), name="progress", daemon=True).start()
+        try:
+            summary = runner.run(ids, on_result=partial(_report, verbose=args.verbose or 0))
+        finally:
+            done.set()
+    finally:
+        journal.close()
+        artifacts.close()
+        datacite.close()
+        repo.close()
+        if cache is not None:
+            cache.close()
+        if index is not None:
+            index.close()
+        if server is not None:
+            server.stop()
+
+    report_unknown_types(resource_types)
+    for line in runner.stage_report():
+        print(line, file=sys.stderr)
+    for service, limiter in runner.limiters.items():
+        if limiter.throttled:
+            print(f"{service}: throttled {limiter.throttled} times, rate now {limiter.rate:.2f}/s", file=sys.stderr)
+    total = len(summary.minted) + len(summary.failed) + len(summary.existing)
+    rate = total / summary.elapsed if summary.elapsed else 0.0
+    print(f"{len(summary.minted)} minted, {len(summary.failed)} failed, {len(summary.existing)} already had a DOI, "
+          f"{summary.skipped} already done in {summary.elapsed:.1f}s ({rate:.2f} items/s)")
+    failed_by_kind = {kind: n for kind in KINDS if (n := sum(r.error_kind == kind for r in summary.failed))}
+    if failed_by_kind:
+        print("failed: " + ", ".join(f"{n} {kind}" for kind, n in failed_by_kind.items())
+              + f"; details in {journal.path.parent}/{FAILED_STREAM}.*.jsonl.gz, "
+              f"retry with: python CLI.py retry-failed {journal.run_id}")
+    metrics.write_json(
+        journal.path.parent / "metrics.json",
+        summary={"minted": len(summary.minted), "failed": len(summary.failed), "existing": len(summary.existing),
+                 "skipped": summary.skipped, "elapsed_s": round(summary.elapsed, 3),
+                 "failed_by_kind": failed_by_kind},
+        stages={name: {"workers": s.workers, "processed": s.processed, "failed": s.failed,
+                       "busy_s": round(s.busy, 3), "blocked_s": round(s.blocked, 3),
+                       "avg_queue": round(s.avg_depth, 2), "max_queue": s.max_depth}
+                for name, s in summary.stages.items()},
+    )
+    if source is not None:
+        # the journal is closed, so every outcome is on disk
+        source.finish(summary)
+    print(f"reminders: python CLI.py export-reminders {journal.run_id}")
+    return 1 if summary.failed else 0
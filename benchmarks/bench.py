@@ -0,0 +1,307 @@
+"""Throughput benchmarks against the local mock DSpace/DataCite server.
+
+    python benchmarks/bench.py --items 2000 --concurrency 16 --latency 0.02
+
+Runs the transform alone, item fetch throughput (sync and async clients) and
+the end-to-end batch runner, then writes items/s and p50/p99 latency to a
+JSON file so runs can be compared. The startup benchmark times ``CLI.py``
+calls that should never load the heavy modules (``--version``, ``--help``,
+a config error); with ``--startup-budget-ms`` it fails when they get slow
+or do. The memory benchmark reports what one in-flight item costs as the
+decoded DSpace item, as its :class:`itemRecord.ItemRecord` and as the
+DataCite payload, and how long the JSON codec takes to decode and encode one.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from batchRunner import BatchRunner  # noqa: E402
+from csvReader import stream_item_ids  # noqa: E402
+from dataciteClient import DataCiteClient  # noqa: E402
+from dataciteTransform import DataCiteConfig, to_datacite  # noqa: E402
+from getDataFromRepo import AsyncOpenRepositoryClient, DSpaceSession, OpenRepositoryClient  # noqa: E402
+from itemRecord import ItemRecord  # noqa: E402
+from jsonCodec import BACKEND, dumps, loads  # noqa: E402
+from mockServer import MockServer, MockSettings, mock_item  # noqa: E402
+from runJournal import RunJournal  # noqa: E402
+
+RESULTS = Path(__file__).resolve().parent / "results"
+CLI = Path(__file__).resolve().parent.parent / "CLI.py"
+# modules only the subcommands that talk to the services should load
+HEAVY_MODULES = ("polars", "httpx", "asyncio", "sqlite3", "opentelemetry")
+STARTUP_CALLS = {"version": ["--version"], "help": ["--help"], "config_error": ["check", "missing.csv"]}
+
+
+def _stats(latencies: list[float], elapsed: float, errors: int = 0) -> dict:
+    latencies = sorted(latencies)
+    q = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    # an empty list leaves q empty, so the quantiles below come out as None
+    return {
+        "items": len(latencies),
+        "errors": errors,
+        "elapsed_s": round(elapsed, 4),
+        "items_per_s": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": round(q[49] * 1000, 3) if q else None,
+        "p99_ms": round(q[98] * 1000, 3) if q else None,
+    }
+
+
+def bench_transform(ids: list[str]) -> dict:
+    config = DataCiteConfig(prefix="10.80000", repository="https://repository.example")
+    items = [mock_item(i)["metadata"] for i in ids]
+    latencies = []
+    start = time.perf_counter()
+    for metadata in items:
+        t = time.perf_counter()
+        to_datacite(metadata, config)
+        latencies.append(time.perf_counter() - t)
+    return _stats(latencies, time.perf_counter() - start)
+
+
+def bench_fetch_sync(url: str, ids: list[str], concurrency: int) -> dict:
+    client = OpenRepositoryClient(url, max_connections=concurrency)
+
+    def fetch(item_id: str) -> tuple[float, bool]:
+        t = time.perf_counter()
+        try:
+            client.get_item_json(item_id)
+            ok = True
+        except httpx.HTTPError:
+            ok = False
+        return time.perf_counter() - t, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        timings = list(pool.map(fetch, ids))
+    elapsed = time.perf_counter() - start
+    client.close()
+    return _stats([t for t, _ in timings], elapsed, sum(not ok for _, ok in timings))
+
+
+def bench_fetch_async(url: str, ids: list[str], concurrency: int) -> dict:
+    async def go() -> dict:
+        errors = 0
+        latencies = []
+        async with AsyncOpenRepositoryClient(url, max_connections=concurrency,
+                                             max_keepalive_connections=concurrency) as client:
+            get_item_json = client.get_item_json
+
+            async def timed(item_id: str) -> dict:
+                # time each request as get_many issues it, like fetch_sync does per call
+                t = time.perf_counter()
+                try:
+                    return await get_item_json(item_id)
+                finally:
+                    latencies.append(time.perf_counter() - t)
+
+            client.get_item_json = timed
+            start = time.perf_counter()
+            async for _, item in client.get_many(ids):
+                errors += isinstance(item, Exception)
+            elapsed = time.perf_counter() - start
+        return _stats(latencies, elapsed, errors)
+
+    return asyncio.run(go())
+
+
+def bench_run(url: str, ids: list[str], args: argparse.Namespace, workdir: Path) -> dict:
+    csv = workdir / "items.csv"
+    csv.write_text("item_uuid\n" + "\n".join(ids) + "\n")
+    journal = RunJournal.open(workdir / "runs")
+    repo = DSpaceSession(url, "bench", "bench", max_connections=args.concurrency)
+    datacite = DataCiteClient(url, "bench:bench", max_connections=args.concurrency)
+    repo.login()
+    runner = BatchRunner(
+        repo,
+        datacite,
+        DataCiteConfig(prefix="10.80000", repository=url, affiliation_name="Mock University"),
+        rps=args.rps,
+        concurrency=args.concurrency,
+        repo_concurrency=args.concurrency,
+        retry_count=args.retry_count,
+        journal=journal,
+    )
+    summary = runner.run(stream_item_ids([str(csv)]))
+    journal.close()
+    datacite.close()
+    repo.close()
+    latencies = [r.latency for r in summary.minted + summary.failed]
+    stats = _stats(latencies, summary.elapsed, len(summary.failed))
+    stats["stages"] = {
+        name: {
+            "workers": stage.workers,
+            "items_per_s": round(stage.processed / summary.elapsed, 2) if summary.elapsed else None,
+            "avg_queue": round(stage.avg_depth, 2),
+            "max_queue": stage.max_depth,
+            "busy": round(stage.utilization(summary.elapsed), 3),
+        }
+        for name, stage in summary.stages.items()
+    }
+    return stats
+
+
+def _bytes_per_item(build, count: int) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(i) for i in range(count)]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return round(size / count)
+
+
+def _us_per_item(call, values: list) -> float:
+    start = time.perf_counter()
+    for value in values:
+        call(value)
+    return round((time.perf_counter() - start) / len(values) * 1e6, 2)
+
+
+def bench_memory(ids: list[str]) -> dict:
+    config = DataCiteConfig(prefix="10.80000", repository="https://repository.example")
+    raw = [json.dumps(mock_item(i)).encode() for i in ids]
+    items = [json.loads(body) for body in raw]
+    payloads = [to_datacite(item["metadata"], config) for item in items]
+    count = len(ids)
+    return {
+        "codec": BACKEND,
+        "bytes_per_item": {
+            "item": _bytes_per_item(lambda i: loads(raw[i]), count),
+            "metadata": _bytes_per_item(lambda i: loads(raw[i])["metadata"], count),
+            "item_record": _bytes_per_item(lambda i: ItemRecord.from_item(loads(raw[i])), count),
+            "payload": _bytes_per_item(lambda i: to_datacite(items[i]["metadata"], config), count),
+        },
+        "us_per_item": {
+            "decode_json": _us_per_item(json.loads, raw),
+            "decode_codec": _us_per_item(loads, raw),
+            "encode_json": _us_per_item(json.dumps, payloads),
+            "encode_codec": _us_per_item(dumps, payloads),
+        },
+    }
+
+
+def bench_startup(repeat: int) -> dict:
+    # without MINT__ settings, check stops at config validation
+    env = {k: v for k, v in os.environ.items() if not k.startswith("MINT__")}
+    results = {}
+    for name, cli_args in STARTUP_CALLS.items():
+        timings = []
+        for _ in range(repeat):
+            t = time.perf_counter()
+            subprocess.run([sys.executable, str(CLI), *cli_args], env=env, capture_output=True)
+            timings.append(time.perf_counter() - t)
+        trace = subprocess.run([sys.executable, "-X", "importtime", str(CLI), *cli_args],
+                               env=env, capture_output=True, text=True).stderr
+        imported = {line.rsplit("|", 1)[-1].strip() for line in trace.splitlines() if "|" in line}
+        results[name] = {
+            "runs": repeat,
+            "p50_ms": round(statistics.median(timings) * 1000, 1),
+            "min_ms": round(min(timings) * 1000, 1),
+            "heavy_imports": sorted(m for m in imported if m.split(".")[0] in HEAVY_MODULES),
+        }
+    baseline = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], env=env, capture_output=True)
+        baseline.append(time.perf_counter() - t)
+    results["python_baseline"] = {"runs": repeat, "p50_ms": round(statistics.median(baseline) * 1000, 1),
+                                  "min_ms": round(min(baseline) * 1000, 1), "heavy_imports": []}
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rps", type=float, default=0, help="DataCite limit for the run benchmark (0 = none)")
+    parser.add_argument("--retry-count", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--bad-rate", type=float, default=0.0,
+                        help="Fraction of mock items that fail the transform (missing dc.publisher)")
+    parser.add_argument("--lost-rate", type=float, default=0.0,
+                        help="Fraction of POSTs and PATCHes the mock applies but answers with 504")
+    parser.add_argument("--only", nargs="*", choices=["transform", "fetch", "run", "startup", "memory"],
+                        help="Benchmarks to run (default: all)")
+    parser.add_argument("--startup-runs", type=int, default=10)
+    parser.add_argument("--startup-budget-ms", type=float,
+                        help="Fail if a startup call's p50 exceeds this many ms over plain `python -c pass`, "
+                             "or if it imports a heavy module")
+    parser.add_argument("--output", type=Path, help="Result file (default: benchmarks/results/<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    selected = set(args.only or ["transform", "fetch", "run", "startup", "memory"])
+    ids = [str(uuid.uuid4()) for _ in range(args.items)]
+    settings = MockSettings(args.latency, args.jitter, args.error_rate, args.throttle_rate, args.retry_after,
+                            bad_rate=args.bad_rate, lost_rate=args.lost_rate)
+    server = MockServer(settings=settings).start()
+    results: dict[str, dict] = {}
+    startup = bench_startup(args.startup_runs) if "startup" in selected else {}
+    memory = bench_memory(ids) if "memory" in selected else {}
+    try:
+        if "transform" in selected:
+            results["transform"] = bench_transform(ids)
+        if "fetch" in selected:
+            results["fetch_sync"] = bench_fetch_sync(server.url, ids, args.concurrency)
+            results["fetch_async"] = bench_fetch_async(server.url, ids, args.concurrency)
+        if "run" in selected:
+            with tempfile.TemporaryDirectory() as workdir:
+                results["run"] = bench_run(server.url, ids, args, Path(workdir))
+    finally:
+        server.stop()
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {k: v for k, v in vars(args).items() if k not in ("output", "only")},
+        "server_calls": settings.counts,
+        "results": results,
+        "startup": startup,
+        "memory": memory,
+    }
+    output = args.output or RESULTS / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    for name, stats in results.items():
+        print(f"{name:12} {stats['items_per_s']:>10} items/s  p50 {stats['p50_ms']} ms  p99 {stats['p99_ms']} ms"
+              f"  errors {stats['errors']}")
+    failed = False
+    if startup:
+        baseline = startup["python_baseline"]["p50_ms"]
+        for name, stats in startup.items():
+            print(f"{name:16} p50 {stats['p50_ms']:>7} ms  min {stats['min_ms']:>7} ms"
+                  + (f"  heavy imports: {', '.join(stats['heavy_imports'])}" if stats["heavy_imports"] else ""))
+            if args.startup_budget_ms is not None and name != "python_baseline" and (
+                    stats["p50_ms"] - baseline > args.startup_budget_ms or stats["heavy_imports"]):
+                print(f"  over the startup budget of {args.startup_budget_ms} ms (or heavy imports)")
+                failed = True
+    if memory:
+        print(f"memory per in-flight item ({memory['codec']}): "
+              + ", ".join(f"{name} {size} B" for name, size in memory["bytes_per_item"].items()))
+        print("codec per item: " + ", ".join(f"{name} {us} us" for name, us in memory["us_per_item"].items()))
+    print(f"results written to {output}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
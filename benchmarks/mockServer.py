@@ -0,0 +1,387 @@
+"""Local stand-in for the DSpace 7 REST API and the DataCite ``/dois`` endpoint.
+
+Serves generated items for any UUID so benchmarks can run the real clients
+without touching production. Latency, 5xx error rate and 429 throttling are
+configurable per server; ``bad_rate`` of the items lack a required field.
+``lost_rate`` of the DataCite POSTs and DSpace PATCHes are applied but
+answered with a 504, like a response lost on the way back. ``private``
+items (embargoed, in workflow) are only served to a logged-in client.
+``deposits`` are items without a DOI that discovery lists for a
+``lastModified:[... TO *] AND -dc.identifier.doi:*`` query until they are
+patched.
+
+    python benchmarks/mockServer.py --port 8787 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+_ITEM = re.compile(r"^/server/api/core/items/([0-9a-fA-F-]{36})$")
+_DOI = re.compile(r"^/dois/(.+/.+)$")
+_TYPES = ["Doctoral Dissertation", "Master's Thesis", "Poster", "Presentation", "Dataset", "Journal Article"]
+
+
+@dataclass
+class MockSettings:
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    retry_after: float = 1.0
+    token_ttl: float = 1800.0
+    counts: dict[str, int] = field(default_factory=dict)
+    dois: dict[str, dict] = field(default_factory=dict)
+    bad_rate: float = 0.0
+    deposits: dict[str, str] = field(default_factory=dict)
+    # item -> its dc.identifier.doi values; a PATCH "add" appends like DSpace does
+    patched: dict[str, list[str]] = field(default_factory=dict)
+    lost_rate: float = 0.0
+    private: set[str] = field(default_factory=set)
+    # deleted items: 404 from core/items and left out of discovery
+    missing: set[str] = field(default_factory=set)
+
+    def deposit(self, count: int, start: str = "2024-01-01T00:00:00") -> None:
+        """Add ``count`` items without a DOI, modified a minute apart from ``start``."""
+        base = time.mktime(time.strptime(start, "%Y-%m-%dT%H:%M:%S"))
+        for _ in range(count):
+            modified = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(base + 60 * len(self.deposits)))
+            self.deposits[str(uuid.uuid4())] = modified + ".000+00:00"
+
+
+def _values(*values: str) -> list[dict]:
+    return [
+        {"value": v, "language": None, "authority": None, "confidence": -1, "place": i}
+        for i, v in enumerate(values)
+    ]
+
+
+def mock_item(item_id: str) -> dict:
+    """Deterministic DSpace item JSON for ``item_id``."""
+    seed = int(hashlib.sha256(item_id.encode()).hexdigest()[:8], 16)
+    authors = [f"Author{seed % 97}, Given{i}" for i in range(1 + seed % 3)]
+    metadata = {
+        "dc.contributor.author": _values(*authors),
+        "dc.date.issued": _values(f"{2000 + seed % 25}-05-01"),
+        "dc.description.abstract": _values("Abstract " * (20 + seed % 200)),
+        "dc.identifier.uri": _values(f"http://hdl.handle.net/20.500.14038/{seed % 100000}"),
+        "dc.publisher": _values("Mock University"),
+        "dc.title": _values(f"Mock item {item_id}"),
+        "dc.type": _values(_TYPES[seed % len(_TYPES)]),
+        # fields real items carry that minting never reads
+        "dc.date.accessioned": _values("2024-01-01T00:00:00Z"),
+        "dc.date.available": _values("2024-01-01T00:00:00Z"),
+        "dc.description.provenance": _values(
+            "Submitted by Mock Depositor (depositor@example.edu) on 2024-01-01T00:00:00Z workflow start=Step: "
+            "reviewstep - action:claimaction No. of bitstreams: 1 mock.pdf: 1048576 bytes, checksum: "
+            f"{seed:032x} (MD5)",
+            "Made available in DSpace on 2024-01-01T00:00:00Z (GMT). No. of bitstreams: 1 mock.pdf: 1048576 bytes, "
+            f"checksum: {seed:032x} (MD5)",
+        ),
+        "dc.subject": _values(*(f"Subject {seed % (i + 7)}" for i in range(3))),
+        "dc.rights": _values("UMass Amherst Open Access Policy"),
+    }
+    orcids = [f"0000-0002-{seed % 10000:04d}-{i:04d}" for i in range(len(authors))]
+    shape = (seed >> 8) % 6
+    if shape == 1:  # one per author, paired by place
+        metadata["dc.identifier.orcid"] = _values(*orcids)
+    elif shape == 3:  # first author linked through its authority, the rest without
+        metadata["dc.contributor.author"][0]["authority"] = f"will be referenced::ORCID::{orcids[0]}"
+        metadata["dc.identifier.orcid"] = _values(orcids[0])
+    elif shape == 5:  # a lone ORCID with no link, which only a sole author can claim
+        metadata["dc.identifier.orcid"] = _values(orcids[-1])
+    return {
+        "id": item_id,
+        "uuid": item_id,
+        "name": f"Mock item {item_id}",
+        "handle": f"20.500.14038/{seed % 100000}",
+        "metadata": metadata,
+        "inArchive": True,
+        "discoverable": True,
+        "withdrawn": False,
+        "lastModified": "2024-01-01T00:00:00.000+00:00",
+        "type": "item",
+        "_links": {"self": {"href": f"/server/api/core/items/{item_id}"}},
+    }
+
+
+def _jwt(ttl: float) -> str:
+    claims = base64.urlsafe_b64encode(json.dumps({"exp": time.time() + ttl}).encode()).decode().rstrip("=")
+    return f"Bearer mock.{claims}.sig"
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    server: "MockServer"
+    protocol_version = "HTTP/1.1"
+    # headers and body go out in separate writes; avoid Nagle/delayed-ACK stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: dict | None = None, headers: dict[str, str] | None = None) -> None:
+        payload = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def _disturb(self, kind: str) -> bool:
+        settings = self.server.settings
+        with self.server.lock:
+            settings.counts[kind] = settings.counts.get(kind, 0) + 1
+        delay = settings.latency + random.uniform(0, settings.jitter)
+        if delay:
+            time.sleep(delay)
+        roll = random.random()
+        if roll < settings.throttle_rate:
+            self._send(429, {"errors": [{"status": "429", "title": "Too Many Requests"}]},
+                       {"Retry-After": f"{settings.retry_after:g}"})
+            return True
+        if roll < settings.throttle_rate + settings.error_rate:
+            self._send(503, {"errors": [{"status": "503", "title": "Service Unavailable"}]})
+            return True
+        return False
+
+    def _lost(self) -> bool:
+        if random.random() >= self.server.settings.lost_rate:
+            return False
+        self._send(504, {"errors": [{"status": "504", "title": "Gateway Timeout"}]})
+        return True
+
+    def _item(self, item_id: str) -> dict:
+        item = mock_item(item_id)
+        # the same items are broken on every request, like bad records in a real repository
+        if int(hashlib.sha256(item_id.encode()).hexdigest()[8:12], 16) < self.server.settings.bad_rate * 0x10000:
+            del item["metadata"]["dc.publisher"]
+        modified = self.server.settings.deposits.get(item_id)
+        if modified:
+            item["lastModified"] = modified
+        dois = self.server.settings.patched.get(item_id)
+        if dois:
+            item["metadata"]["dc.identifier.doi"] = _values(*dois)
+        return item
+
+    def _authorized(self) -> bool:
+        return self.headers.get("Authorization", "").startswith("Bearer mock.")
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/server/api/security/csrf":
+            self._send(204, None, {"DSPACE-XSRF-TOKEN": "mock-xsrf", "Set-Cookie": "DSPACE-XSRF-COOKIE=mock-xsrf; Path=/"})
+            return
+        if url.path == "/dois":
+            if not self.headers.get("Authorization"):
+                self._send(401, {"errors": [{"status": "401", "title": "Bad credentials"}]})
+                return
+            query = parse_qs(url.query)
+            prefix = query.get("prefix", [""])[0]
+            size = int(query.get("page[size]", ["25"])[0])
+            # the mock's cursor is a plain offset, "1" being the first page as in DataCite
+            offset = max(0, int(query.get("page[cursor]", ["1"])[0]) - 1)
+            with self.server.lock:
+                records = [{"id": doi, "type": "dois", "attributes": attributes}
+                           for doi, attributes in self.server.settings.dois.items() if doi.startswith(prefix + "/")]
+            page = records[offset:offset + size]
+            links = {}
+            if offset + size < len(records):
+                links["next"] = (f"http://{self.headers['Host']}/dois?prefix={prefix}"
+                                 f"&page[cursor]={offset + size + 1}&page[size]={size}")
+            self._send(200, {"data": page, "meta": {"total": len(records)}, "links": links})
+            return
+        match = _DOI.match(url.path)
+        if match:
+            if self._disturb("datacite"):
+                return
+            with self.server.lock:
+                attributes = self._stored_doi(match.group(1)) if match.group(1) in self.server.settings.dois else None
+            if attributes is None:
+                self._send(404, {"errors": [{"status": "404", "title": "The resource you are looking for doesn't exist."}]})
+            else:
+                self._send(200, {"data": {"id": match.group(1), "type": "dois", "attributes": attributes}})
+            return
+        if self._disturb("dspace"):
+            return
+        match = _ITEM.match(url.path)
+        if match:
+            if match.group(1) in self.server.settings.missing:
+                self._send(404, {"message": "The resource you are looking for doesn't exist."})
+                return
+            if match.group(1) in self.server.settings.private and not self._authorized():
+                self._send(401, {"message": "Authentication is required"})
+                return
+            self._send(200, self._item(match.group(1)), {"ETag": '"mock-v1"'})
+            return
+        if url.path == "/server/api/discover/search/objects":
+            query = parse_qs(url.query)
+            text = query.get("query", [""])[0]
+            since = re.search(r"lastModified:\[(\S+) TO \*\]", text)
+            if since and "-dc.identifier.doi:*" in text:
+                settings = self.server.settings
+                with self.server.lock:
+                    ids = sorted((i for i, m in settings.deposits.items()
+                                  if m[:19] >= since.group(1)[:19] and i not in settings.patched),
+                                 key=settings.deposits.get)
+            else:
+                ids = [i for i in re.findall(r"[0-9a-fA-F-]{36}", text) if i not in self.server.settings.missing]
+            size = int(query.get("size", [str(len(ids) or 1)])[0])
+            number = int(query.get("page", ["0"])[0])
+            objects = [{"_embedded": {"indexableObject": self._item(i)}} for i in ids[number * size:(number + 1) * size]]
+            self._send(200, {"_embedded": {"searchResult": {
+                "_embedded": {"objects": objects},
+                "page": {"number": number, "size": size, "totalElements": len(ids),
+                         "totalPages": -(-len(ids) // size)},
+            }}})
+            return
+        self._send(404, {"message": "not found"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = self._body()
+        if url.path == "/server/api/authn/login":
+            self._send(200, None, {"Authorization": _jwt(self.server.settings.token_ttl), "DSPACE-XSRF-TOKEN": "mock-xsrf"})
+            return
+        if url.path == "/server/api/authn/logout":
+            self._send(204)
+            return
+        if url.path == "/dois":
+            if self._disturb("datacite"):
+                return
+            attributes = json.loads(body)["data"]["attributes"]
+            doi = attributes.get("doi") or f"{attributes['prefix']}/mock-{random.getrandbits(48):012x}"
+            with self.server.lock:
+                taken = doi in self.server.settings.dois
+                if not taken:
+                    self.server.settings.dois[doi] = {
+                        "url": attributes.get("url"), "state": "draft",
+                        "updated": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                        "attributes": {k: v for k, v in attributes.items() if k not in ("prefix", "doi")},
+                    }
+            if taken:
+                self._send(422, {"errors": [{"source": "doi", "title": "This DOI has already been taken", "uid": doi}]})
+                return
+            if self._lost():
+                return
+            self._send(201, {"data": {"id": doi, "type": "dois", "attributes": {
+                "doi": doi, "url": attributes.get("url"), "state": "draft",
+            }}})
+            return
+        self._send(404, {"message": "not found"})
+
+    def _stored_doi(self, doi: str) -> dict:
+        # the record as DataCite returns it: numbers for years, blanks dropped, fields of its own added
+        record = self.server.settings.dois[doi]
+        attributes = json.loads(json.dumps(record.get("attributes", {})))
+        if "publicationYear" in attributes:
+            attributes["publicationYear"] = int(attributes["publicationYear"])
+        for creator in attributes.get("creators", []):
+            for key in [k for k, v in creator.items() if v == ""]:
+                del creator[key]
+        return attributes | {"doi": doi, "url": record["url"], "state": record["state"],
+                             "updated": record["updated"], "schemaVersion": "http://datacite.org/schema/kernel-4"}
+
+    def do_PUT(self):
+        body = self._body()
+        match = _DOI.match(urlparse(self.path).path)
+        if not match or not self.headers.get("Authorization"):
+            self._send(404 if not match else 401, {"errors": [{"status": "404", "title": "not found"}]})
+            return
+        if self._disturb("datacite"):
+            return
+        doi = match.group(1)
+        attributes = json.loads(body)["data"]["attributes"]
+        with self.server.lock:
+            record = self.server.settings.dois.get(doi)
+            if record is not None:
+                event = attributes.pop("event", None)
+                record.setdefault("attributes", {}).update(attributes)
+                record["url"] = attributes.get("url", record["url"])
+                record["updated"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+                if event == "publish":
+                    record["state"] = "findable"
+                response = {"data": {"id": doi, "type": "dois", "attributes": self._stored_doi(doi)}}
+        if record is None:
+            self._send(404, {"errors": [{"status": "404", "title": "The resource you are looking for doesn't exist."}]})
+            return
+        self._send(200, response)
+
+    def do_PATCH(self):
+        body = self._body()
+        if not self._authorized():
+            self._send(401, {"message": "unauthorized"})
+            return
+        if self._disturb("dspace"):
+            return
+        match = _ITEM.match(urlparse(self.path).path)
+        if match:
+            with self.server.lock:
+                dois = self.server.settings.patched.setdefault(match.group(1), [])
+                for op in json.loads(body or b"[]"):
+                    if op.get("path") == "/metadata/dc.identifier.doi":
+                        dois[:] = [*dois, op["value"]["value"]] if op["op"] == "add" else [op["value"]["value"]]
+            if self._lost():
+                return
+            self._send(200, self._item(match.group(1)))
+            return
+        self._send(404, {"message": "not found"})
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, settings: MockSettings | None = None):
+        super().__init__(("127.0.0.1", port), MockHandler)
+        self.settings = settings or MockSettings()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self) -> "MockServer":
+        threading.Thread(target=self.serve_forever, name="mock-server", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every API call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Extra uniform random latency, seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of calls answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    parser.add_argument("--bad-rate", type=float, default=0.0, help="Fraction of items without dc.publisher")
+    parser.add_argument("--lost-rate", type=float, default=0.0,
+                        help="Fraction of DataCite POSTs and DSpace PATCHes applied but answered with 504")
+    parser.add_argument("--deposits", type=int, default=0, help="Items without a DOI for `CLI.py sync` to find")
+    args = parser.parse_args()
+    settings = MockSettings(args.latency, args.jitter, args.error_rate, args.throttle_rate, args.retry_after)
+    settings.bad_rate = args.bad_rate
+    settings.lost_rate = args.lost_rate
+    settings.deposit(args.deposits)
+    server = MockServer(args.port, settings)
+    print(f"serving DSpace and DataCite mocks on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,8 @@
+import sys
+import uuid
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass
+
 import polars as pl
 
 def load_item_ids(csv_path: str, column: str = "item_uuid") -> list[str]:
@@ -8,4 +13,74 @@ def load_item_ids(csv_path: str, column: str = "item_uuid") -> list[str]:
         .drop_nulls()
         .to_list()
     )
-    return [x for x in ids if x]
\ No newline at end of file
+    return [x for x in ids if x]
+
+
+@dataclass(frozen=True)
+class InvalidRow:
+    path: str
+    line: int
+    value: str
+    reason: str
+
+    def __str__(self) -> str:
+        return f"{self.path}:{self.line}: {self.reason}: {self.value!r}"
+
+
+def _report_invalid(row: InvalidRow) -> None:
+    print(f"skipping {row}", file=sys.stderr)
+
+
+def check_column(csv_path: str, column: str = "item_uuid") -> None:
+    """Read only the header; raise ``ValueError`` if the file is not a CSV with ``column``."""
+    try:
+        schema = pl.scan_csv(csv_path, infer_schema=False).collect_schema()
+    except (OSError, pl.exceptions.PolarsError) as e:
+        raise ValueError(f"{csv_path}: not a readable CSV: {e}") from None
+    if column not in schema:
+        raise ValueError(f"{csv_path}: no {column!r} column")
+
+
+def scan_column(csv_path: str, column: str = "item_uuid", chunk_size: int = 50_000) -> Iterator[tuple[int, str | None]]:
+    """Yield ``(line_number, value)`` for ``column`` without loading the whole file.
+
+    Line numbers count the header as line 1 and assume no quoted newlines.
+    """
+    lf = (
+        pl.scan_csv(csv_path, infer_schema=False)
+        .select(pl.col(column).str.strip_chars())
+        .with_row_index("line", offset=2)
+    )
+    try:
+        for batch in lf.collect_batches(chunk_size=chunk_size, lazy=True):
+            yield from batch.iter_rows()
+    except pl.exceptions.ColumnNotFoundError:
+        raise ValueError(f"{csv_path}: no {column!r} column") from None
+
+
+def stream_item_ids(
+    csv_paths: Iterable[str],
+    column: str = "item_uuid",
+    on_invalid: Callable[[InvalidRow], None] | None = _report_invalid,
+) -> Iterator[str]:
+    """Yield normalized item UUIDs from every CSV in order, each at most once.
+
+    Blank cells are skipped; values that are not UUIDs are passed to
+    ``on_invalid`` with their file and line. Seen ids are kept as 16-byte
+    UUID values rather than strings.
+    """
+    seen: set[bytes] = set()
+    for csv_path in csv_paths:
+        for line, value in scan_column(csv_path, column):
+            if not value:
+                continue
+            try:
+                item_id = uuid.UUID(value)
+            except ValueError:
+                if on_invalid is not None:
+                    on_invalid(InvalidRow(csv_path, line, value, "not a UUID"))
+                continue
+            if item_id.bytes in seen:
+                continue
+            seen.add(item_id.bytes)
+            yield str(item_id)
@@ -0,0 +1,104 @@
+from collections.abc import Iterator
+from dataclasses import dataclass
+
+import httpx
+
+from artifacts import ArtifactWriter
+from jsonCodec import dumps, loads
+
+
+@dataclass(frozen=True)
+class MintedDoi:
+    doi: str
+    url: str
+
+
+def _minted(content: bytes) -> MintedDoi:
+    data = loads(content)["data"]
+    return MintedDoi(data["id"], data["attributes"]["url"])
+
+
+class DataCiteClient:
+    """Pooled keep-alive client for the DataCite REST API ``/dois`` endpoint.
+
+    Payloads are serialized straight into the request body; only ``data.id``
+    and ``data.attributes.url`` are kept from the response. The client is
+    thread-safe, so many POSTs can share its connection pool at once. With
+    ``artifacts``, payloads and responses are also kept in the run's
+    ``payloads``/``responses`` streams.
+    """
+
+    def __init__(
+        self,
+        base: str,
+        token: str | None,
+        timeout: float = 30.0,
+        max_connections: int = 10,
+        artifacts: ArtifactWriter | None = None,
+    ):
+        headers = {"Content-Type": "application/vnd.api+json"}
+        if token:
+            # accept either a bare Basic credential or a full Authorization header value
+            headers["Authorization"] = token if " " in token else f"Basic {token}"
+        self.artifacts = artifacts
+        self.client = httpx.Client(
+            base_url=base,
+            timeout=timeout,
+            headers=headers,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def check_auth(self, prefix: str) -> None:
+        """Probe the credentials with one authenticated DOI listing; raises on 401/403."""
+        r = self.client.get("/dois", params={"prefix": prefix, "page[size]": 1})
+        r.raise_for_status()
+
+    def iter_dois(self, prefix: str, updated_since: str | None = None, page_size: int = 1000) -> Iterator[dict]:
+        """Page through the DOIs under ``prefix`` with cursor pagination, oldest update first.
+
+        Without a token only findable DOIs are listed.
+        """
+        params = {"prefix": prefix, "page[cursor]": 1, "page[size]": page_size, "sort": "updated",
+                  "fields[dois]": "url,state,updated"}
+        if updated_since is not None:
+            params["query"] = f'updated:["{updated_since}" TO *]'
+        url, query = "/dois", params
+        while url:
+            r = self.client.get(url, params=query)
+            r.raise_for_status()
+            body = loads(r.content)
+            yield from body.get("data", [])
+            # links.next carries the cursor of the following page
+            url, query = body.get("links", {}).get("next"), None
+            if not body.get("data"):
+                return
+
+    def mint_draft(self, payload: dict, key: str | None = None) -> MintedDoi:
+        """POST a draft DOI; ``key`` (usually the item UUID) labels the artifact records."""
+        r = self.client.post("/dois", content=dumps(payload))
+        if self.artifacts is not None:
+            self.artifacts.write("payloads", {"item": key, "payload": payload})
+            try:
+                response = loads(r.content)
+            except ValueError:
+                response = r.text
+            self.artifacts.write("responses", {"item": key, "status": r.status_code, "response": response})
+        r.raise_for_status()
+        return _minted(r.content)
+
+    def get_doi(self, doi: str) -> dict:
+        """The attributes DataCite has for ``doi``, with affiliations as objects like the transform writes them."""
+        r = self.client.get(f"/dois/{doi}", params={"affiliation": "true"})
+        r.raise_for_status()
+        return loads(r.content)["data"]["attributes"]
+
+    def update_doi(self, doi: str, attributes: dict, event: str | None = None) -> None:
+        """PUT ``attributes`` (only those to change) to ``doi``; ``event`` is e.g. ``"publish"``."""
+        if event is not None:
+            attributes = attributes | {"event": event}
+        payload = {"data": {"type": "dois", "attributes": attributes}}
+        r = self.client.put(f"/dois/{doi}", content=dumps(payload))
+        r.raise_for_status()
+
+    def close(self) -> None:
+        self.client.close()
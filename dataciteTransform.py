@@ -0,0 +1,165 @@
+import hashlib
+import re
+from dataclasses import dataclass, field
+
+from resourceTypes import ResourceTypeMap, default_map
+
+_ORCID = re.compile(r"\d{4}-\d{4}-\d{4}-\d{3}[\dX]")
+# http://hdl.handle.net/<prefix>/<suffix> or <repository>/handle/<prefix>/<suffix>
+_HANDLE = re.compile(r"(?:/handle/|hdl\.handle\.net/)([^/?#]+/[^/?#]+)")
+# Crockford base32, as in the suffixes DataCite generates itself
+_SUFFIX_ALPHABET = "0123456789abcdefghjkmnpqrstvwxyz"
+
+
+@dataclass(frozen=True)
+class DataCiteConfig:
+    prefix: str
+    repository: str
+    affiliation_name: str | None = None
+    affiliation_ror: str | None = None
+    language: str = "en"
+    resource_types: ResourceTypeMap = field(default_factory=default_map, compare=False, repr=False)
+
+    @property
+    def affiliation(self) -> dict | None:
+        if not self.affiliation_name:
+            return None
+        affiliation = {"name": self.affiliation_name}
+        if self.affiliation_ror:
+            affiliation |= {
+                "affiliationIdentifier": self.affiliation_ror,
+                "affiliationIdentifierScheme": "ROR",
+                "schemeUri": "https://ror.org/",
+            }
+        return affiliation
+
+
+def _value(metadata: dict, key: str) -> str:
+    return metadata[key][0]["value"]
+
+
+def _creator(name: str, affiliations: list[dict]) -> dict:
+    if "," in name:
+        family, _, given = name.partition(", ")
+        creator = {"name": name, "nameType": "Personal", "givenName": given, "familyName": family}
+    else:
+        creator = {"name": name, "nameType": "Organizational", "givenName": "", "familyName": ""}
+    if affiliations:
+        creator["affiliation"] = affiliations
+    return creator
+
+
+def _orcid(orcid: str) -> list[dict]:
+    return [{
+        "schemeUri": "https://orcid.org",
+        "nameIdentifier": "https://orcid.org/" + orcid,
+        "nameIdentifierScheme": "ORCID",
+    }]
+
+
+def handle_key(url: str | None) -> str | None:
+    """``<prefix>/<suffix>`` of a handle URL, so repository and hdl.handle.net links compare equal."""
+    if not url:
+        return None
+    match = _HANDLE.search(url)
+    return match.group(1) if match else url
+
+
+def handle_url(repository: str, identifier_uri: str) -> str:
+    """``<repository>/handle/<prefix>/<suffix>`` for either form of handle URL; ``KeyError`` if it is neither."""
+    match = _HANDLE.search(identifier_uri)
+    if match is None:
+        raise KeyError(f"dc.identifier.uri is not a handle URL: {identifier_uri!r}")
+    return f"{repository.rstrip('/')}/handle/{match.group(1)}"
+
+
+def item_doi(prefix: str, item_id: str) -> str:
+    """The DOI to mint for ``item_id``, e.g. ``10.80000/4gq1-xm8z-7d2k``.
+
+    It is derived from the item UUID, so posting the same item twice cannot
+    create a second draft: DataCite answers the repeat with a 422.
+    """
+    n = int.from_bytes(hashlib.sha256(item_id.lower().encode()).digest()[:8], "big") >> 4
+    suffix = "".join(_SUFFIX_ALPHABET[(n >> shift) & 31] for shift in range(55, -1, -5))
+    return f"{prefix}/{suffix[:4]}-{suffix[4:8]}-{suffix[8:]}"
+
+
+def _by_place(values: list[dict]) -> list[dict]:
+    return sorted(values, key=lambda v: v.get("place", 0))
+
+
+def _orcid_in(authority: str | None) -> str | None:
+    # ORCID-controlled authors carry e.g. "will be referenced::ORCID::0000-0002-1825-0097"
+    match = _ORCID.search(authority) if authority else None
+    return match.group(0) if match else None
+
+
+def pair_orcids(metadata: dict) -> tuple[dict[int, str], list[str]]:
+    """Match ``dc.identifier.orcid`` values to ``dc.contributor.author`` values.
+
+    Returns ``({author index: orcid}, unmatched orcids)``. An author whose
+    authority is an ORCID gets that iD; an ORCID sharing its authority with an
+    author goes to that author. The rest are paired by ``place`` when every
+    author has an ORCID, or given to the only author; anything else is left
+    unmatched rather than guessed.
+    """
+    authors = _by_place(metadata.get("dc.contributor.author", []))
+    orcids = _by_place(metadata.get("dc.identifier.orcid", []))
+    paired: dict[int, str] = {}
+    left = list(orcids)
+    for i, author in enumerate(authors):
+        orcid = _orcid_in(author.get("authority"))
+        if orcid is not None:
+            paired[i] = orcid
+            left = [o for o in left if o["value"] != orcid]
+    by_authority = {a["authority"]: i for i, a in enumerate(authors) if a.get("authority") and i not in paired}
+    for o in list(left):
+        i = by_authority.get(o.get("authority"))
+        if i is not None and i not in paired:
+            paired[i] = o["value"]
+            left.remove(o)
+    rest = [i for i in range(len(authors)) if i not in paired]
+    if len(orcids) == len(authors) and len(rest) == len(left):
+        paired.update(zip(rest, (o["value"] for o in left)))
+        left = []
+    elif len(authors) == 1 and rest and left:
+        paired[0] = left.pop(0)["value"]
+    return paired, [o["value"] for o in left]
+
+
+def unmatched_orcids(metadata: dict) -> list[str]:
+    """ORCIDs that :func:`to_datacite` could not attach to a creator."""
+    return pair_orcids(metadata)[1]
+
+
+def to_datacite(metadata: dict, config: DataCiteConfig) -> dict:
+    """Build the DataCite draft DOI payload from a DSpace item's ``metadata`` in one pass.
+
+    Raises ``KeyError`` when a required field (title, issued date, publisher,
+    identifier uri, author, type) is missing or the identifier uri is not a
+    handle URL.
+    """
+    affiliation = config.affiliation
+    affiliations = [affiliation] if affiliation else []
+    authors = _by_place(metadata["dc.contributor.author"])
+    creators = [_creator(a["value"], affiliations) for a in authors]
+    for i, orcid in pair_orcids(metadata)[0].items():
+        creators[i]["nameIdentifiers"] = _orcid(orcid)
+
+    attributes = {
+        "prefix": config.prefix,
+        "creators": creators,
+        "titles": [{"title": _value(metadata, "dc.title")}],
+        "publisher": _value(metadata, "dc.publisher"),
+        "publicationYear": _value(metadata, "dc.date.issued")[:4],
+        "language": config.language,
+        "types": config.resource_types.types(_value(metadata, "dc.type")),
+        "url": handle_url(config.repository, _value(metadata, "dc.identifier.uri")),
+    }
+    abstract = metadata.get("dc.description.abstract")
+    if abstract:
+        attributes["descriptions"] = [
+            {"lang": config.language, "description": abstract[0]["value"], "descriptionType": "Abstract"}
+        ]
+    return {"data": {"type": "dois", "attributes": attributes}}
+
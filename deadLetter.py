@@ -0,0 +1,107 @@
+import sys
+from dataclasses import replace
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import httpx
+
+from artifacts import read_stream
+from getDataFromRepo import OpenRepositoryClient
+from resourceTypes import ResourceTypeMap
+from shardRunner import run_workers, shard_count
+
+if TYPE_CHECKING:
+    from batchRunner import RunSummary
+    from CLI import ParsedArgs
+
+STREAM = "failed"
+KINDS = ("transform", "auth", "validation", "client", "server", "network", "other")
+# the service each pipeline stage talks to
+_SERVICES = {"fetch": "dspace", "patch": "dspace", "mint": "datacite"}
+
+
+def classify_error(stage: str, error: Exception) -> str:
+    """One of :data:`KINDS` for an item that failed in ``stage``."""
+    if stage == "transform":
+        return "transform"
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        if status in (401, 403):
+            return "auth"
+        if status == 422:
+            return "validation"
+        return "server" if status >= 500 or status == 429 else "client"
+    if isinstance(error, httpx.TransportError):
+        return "network"
+    return "other"
+
+
+def _response_body(response: httpx.Response):
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+
+def dead_letter(item_id: str, stage: str, error: Exception, attempts: int, doi: str | None = None,
+                payload: dict | None = None, metadata: dict | None = None) -> dict:
+    """The ``failed`` stream record of an item: what failed, what was sent and what came back."""
+    record = {
+        "item": item_id,
+        "stage": stage,
+        "service": _SERVICES.get(stage),
+        "kind": classify_error(stage, error),
+        "error": f"{type(error).__name__}: {error}",
+        "attempts": attempts,
+    }
+    if doi is not None:
+        # minted but not patched: retry-failed only patches it
+        record["doi"] = doi
+    if isinstance(error, httpx.HTTPStatusError):
+        record["status"] = error.response.status_code
+        record["response"] = _response_body(error.response)
+    if payload is not None:
+        record["payload"] = payload
+    elif metadata is not None:
+        # no payload yet: keep the repository metadata the transform choked on
+        record["metadata"] = metadata
+    return record
+
+
+class FailedItems:
+    """The items of a run's dead-letter stream, for ``retry-failed``.
+
+    The run is resumed, so items a previous retry got through are skipped by
+    its journal and minted-but-unpatched items only get the PATCH.
+    """
+
+    def __init__(self, run_dir: Path):
+        self.ids = list(dict.fromkeys(record["item"] for record in read_stream(run_dir, STREAM)))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def item_ids(self, repo: OpenRepositoryClient) -> list[str]:
+        return self.ids
+
+    def finish(self, summary: "RunSummary") -> None:
+        pass
+
+
+def run_retry_failed(args: "ParsedArgs", resource_types: ResourceTypeMap) -> int:
+    """Run the failed items of ``args.run_id`` again, all shards at once if the run was sharded."""
+    from batchRunner import run_batch
+
+    run_dir = args.run_directory / args.run_id
+    failed = FailedItems(run_dir)
+    if not failed:
+        print(f"run {args.run_id} has no failed items", file=sys.stderr)
+        return 0
+    print(f"retrying {len(failed)} failed items of run {args.run_id}", file=sys.stderr)
+    # failures are usually fixed by editing the item, so read it fresh rather than from the item cache
+    args = replace(args, resume=args.run_id, no_cache=True)
+    count = shard_count(run_dir)
+    if not count:
+        return run_batch(args, resource_types, failed)
+    # like run --workers: each shard resumes its own journal with its 1/N of the rate budget, in parallel
+    return run_workers(replace(args, workers=count))
@@ -0,0 +1,197 @@
+import re
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import httpx
+
+from dataciteClient import DataCiteClient
+from dataciteTransform import handle_key
+from getDataFromRepo import DSpaceSession, OpenRepositoryClient
+
+if TYPE_CHECKING:
+    from CLI import ParsedArgs
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS datacite (
+    doi TEXT PRIMARY KEY,
+    handle TEXT,
+    state TEXT,
+    updated TEXT
+);
+CREATE INDEX IF NOT EXISTS datacite_handle ON datacite(handle);
+CREATE TABLE IF NOT EXISTS repository (
+    item_id TEXT PRIMARY KEY,
+    doi TEXT NOT NULL,
+    handle TEXT,
+    last_modified TEXT
+);
+CREATE INDEX IF NOT EXISTS repository_handle ON repository(handle);
+CREATE TABLE IF NOT EXISTS watermarks (
+    source TEXT PRIMARY KEY,
+    updated TEXT NOT NULL
+);
+"""
+
+_DOI = re.compile(r"^(?:https?://(?:dx\.)?doi\.org/|doi:)", re.IGNORECASE)
+
+
+def solr_date(value: str) -> str:
+    # DSpace reports lastModified as e.g. 2024-05-01T12:00:00.123+00:00; Solr range queries want UTC "Z" form
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return value
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S") + "Z"
+
+
+def bare_doi(value: str) -> str:
+    return _DOI.sub("", value.strip()).lower()
+
+
+class DoiIndex:
+    """SQLite index of DOIs that already exist, keyed by item UUID and by handle.
+
+    Filled from DataCite (every DOI under the prefix, by landing-page handle)
+    and from the repository (items carrying ``dc.identifier.doi``). Each
+    source keeps the newest ``updated``/``lastModified`` it has seen, so
+    :meth:`sync_datacite` and :meth:`sync_repository` only page through what
+    changed since the last sync. Lookups are single primary-key/index reads
+    and safe from many threads.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def watermark(self, source: str) -> str | None:
+        with self._lock:
+            row = self._db.execute("SELECT updated FROM watermarks WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def advance_watermark(self, source: str, updated: str) -> None:
+        """Move ``source``'s watermark forward to ``updated``; it never moves back."""
+        self._save("watermarks", [], source, updated)
+
+    def _save(self, table: str, rows: list[tuple], source: str | None = None, newest: str | None = None) -> None:
+        placeholders = ", ".join("?" * len(rows[0])) if rows else ""
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                if rows:
+                    self._db.executemany(f"INSERT OR REPLACE INTO {table} VALUES ({placeholders})", rows)
+                if source is not None and newest is not None:
+                    self._db.execute(
+                        "INSERT INTO watermarks (source, updated) VALUES (?, ?)"
+                        " ON CONFLICT(source) DO UPDATE SET updated = max(updated, excluded.updated)",
+                        (source, newest),
+                    )
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                # e.g. "database is locked" by another shard; leave the connection usable
+                self._db.execute("ROLLBACK")
+                raise
+
+    def add_datacite(self, doi: str, url: str | None, state: str | None = None, updated: str | None = None) -> None:
+        self._save("datacite", [(bare_doi(doi), handle_key(url), state, updated)])
+
+    def add_item(self, item_id: str, doi: str, url: str | None, last_modified: str | None = None) -> None:
+        self._save("repository", [(item_id, bare_doi(doi), handle_key(url), last_modified)])
+
+    def sync_datacite(self, datacite: DataCiteClient, prefix: str, batch: int = 1000) -> int:
+        """Add DOIs under ``prefix`` created or updated since the last sync; returns how many were read."""
+        source = f"datacite:{prefix}"
+        since = self.watermark(source)
+        rows: list[tuple] = []
+        newest = since
+        count = 0
+        for record in datacite.iter_dois(prefix, updated_since=since, page_size=batch):
+            attributes = record.get("attributes", {})
+            updated = attributes.get("updated")
+            rows.append((bare_doi(record["id"]), handle_key(attributes.get("url")), attributes.get("state"), updated))
+            if updated and (newest is None or updated > newest):
+                newest = updated
+            if len(rows) >= batch:
+                # commit page by page so an interrupted sync keeps what it read
+                self._save("datacite", rows)
+                count += len(rows)
+                rows = []
+        self._save("datacite", rows, source, newest)
+        return count + len(rows)
+
+    def sync_repository(self, repo: OpenRepositoryClient, batch: int = 100) -> int:
+        """Add repository items with a ``dc.identifier.doi`` modified since the last sync."""
+        source = f"repository:{repo.repository}"
+        since = self.watermark(source)
+        query = "dc.identifier.doi:*"
+        if since is not None:
+            query += f" AND lastModified:[{solr_date(since)} TO *]"
+        rows: list[tuple] = []
+        newest = since
+        for item in repo.search_items(query, page_size=batch):
+            metadata = item.get("metadata", {})
+            dois = metadata.get("dc.identifier.doi")
+            if not dois:
+                continue
+            uris = metadata.get("dc.identifier.uri")
+            handle = handle_key(uris[0]["value"]) if uris else None
+            modified = item.get("lastModified")
+            rows.append((item["uuid"], bare_doi(dois[0]["value"]), handle, modified))
+            if modified and (newest is None or modified > newest):
+                newest = modified
+        self._save("repository", rows, source, newest)
+        return len(rows)
+
+    def doi_for_item(self, item_id: str) -> str | None:
+        with self._lock:
+            row = self._db.execute("SELECT doi FROM repository WHERE item_id = ?", (item_id,)).fetchone()
+        return row[0] if row else None
+
+    def doi_for_url(self, url: str) -> str | None:
+        """A DOI already registered for the landing page ``url``, if any."""
+        handle = handle_key(url)
+        with self._lock:
+            row = self._db.execute("SELECT doi FROM datacite WHERE handle = ? LIMIT 1", (handle,)).fetchone() \
+                or self._db.execute("SELECT doi FROM repository WHERE handle = ? LIMIT 1", (handle,)).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def sync_index(index: DoiIndex, repo: OpenRepositoryClient, datacite: DataCiteClient, prefix: str) -> bool:
+    """Bring the index up to date; a failed sync leaves it as it was and only warns."""
+    try:
+        records = index.sync_datacite(datacite, prefix)
+        items = index.sync_repository(repo)
+    except httpx.HTTPError as e:
+        print(f"DOI index not updated: {e}", file=sys.stderr)
+        return False
+    print(f"DOI index: {records} DataCite records, {items} repository items updated", file=sys.stderr)
+    return True
+
+
+def run_index(args: "ParsedArgs") -> int:
+    if args.repo_user and args.repo_password:
+        repo = DSpaceSession(args.repo_url, args.repo_user, args.repo_password)
+        repo.login()
+    else:
+        # anonymous discovery only sees public items
+        repo = OpenRepositoryClient(args.repo_url)
+    datacite = DataCiteClient(args.datacite_base, args.datacite_token)
+    index = DoiIndex(args.run_directory / "doi_index.sqlite3")
+    try:
+        return 0 if sync_index(index, repo, datacite, args.prefix) else 1
+    finally:
+        index.close()
+        datacite.close()
+        repo.close()
@@ -1,28 +1,395 @@
-import json
-import httpx
+import asyncio
+import base64
+import sqlite3
+import sys
+import threading
+import time
+from collections.abc import AsyncIterator, Callable, Iterable, Iterator
+from datetime import datetime
+from email.utils import format_datetime
 from urllib.parse import urljoin
 
+import httpx
+
+from itemCache import CachedItem, ItemCache
+from itemRecord import ItemRecord
+from jsonCodec import dumps, loads, pretty
+
+
+def _http_date(last_modified: str) -> str:
+    # DSpace reports lastModified as ISO-8601; If-Modified-Since wants an HTTP-date
+    try:
+        return format_datetime(datetime.fromisoformat(last_modified.replace("Z", "+00:00")), usegmt=True)
+    except ValueError:
+        return last_modified
+
+
+def _conditional_headers(cached: CachedItem | None) -> dict[str, str]:
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = _http_date(cached.last_modified)
+    return headers
+
 
-class OpenRepositoryClient:
-    def __init__(self, repository: str, timeout: float = 30.0):
+class _RepositoryBase:
+    def __init__(self, repository: str, cache: ItemCache | None = None):
         self.repository = repository.rstrip("/") + "/"
-        self.client = httpx.Client(timeout=timeout)
+        self.cache = cache
 
     def item_url(self, item_id: str) -> str:
         return urljoin(self.repository, f"server/api/core/items/{item_id}")
 
-    def get_item_json(self, item_id: str) -> dict:
-        url = self.item_url(item_id)
-        r = self.client.get(url)
+    def _api(self, path: str) -> str:
+        return urljoin(self.repository, f"server/api/{path}")
+
+    def _track_xsrf(self, response: httpx.Response) -> None:
+        token = response.headers.get("DSPACE-XSRF-TOKEN")
+        if token and token != self.client.headers.get("X-XSRF-TOKEN"):
+            self.client.headers["X-XSRF-TOKEN"] = token
+
+    def _cached(self, item_id: str) -> CachedItem | None:
+        if self.cache is None:
+            return None
+        try:
+            return self.cache.get(item_id)
+        except sqlite3.Error as e:
+            print(f"item cache not read: {e}", file=sys.stderr)
+            return None
+
+    def _update_cache(self, update: Callable[[], None]) -> None:
+        # the cache only saves requests; a locked database must not fail an item the repository answered
+        try:
+            update()
+        except sqlite3.Error as e:
+            print(f"item cache not updated: {e}", file=sys.stderr)
+
+    def _store(self, item_id: str, r: httpx.Response, cached: CachedItem | None) -> dict:
+        """Item JSON from a (conditional) GET response, kept in the cache if there is one."""
+        if r.status_code == 304 and cached is not None:
+            self._update_cache(lambda: self.cache.touch(item_id))
+            return cached.item
         r.raise_for_status()
-        return r.json()
+        item = loads(r.content)
+        if self.cache is not None:
+            self._update_cache(lambda: self.cache.put(
+                item_id,
+                r.content,
+                etag=r.headers.get("ETag"),
+                last_modified=r.headers.get("Last-Modified") or item.get("lastModified"),
+            ))
+        return item
+
+
+class OpenRepositoryClient(_RepositoryBase):
+    def __init__(
+        self,
+        repository: str,
+        timeout: float = 30.0,
+        max_connections: int = 10,
+        cache: ItemCache | None = None,
+    ):
+        super().__init__(repository, cache)
+        self.client = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        return self.client.request(method, url, **kwargs)
+
+    def get_item_json(self, item_id: str, fresh: bool = False) -> dict:
+        """The item's JSON; ``fresh`` reads it from the repository even if the cache has it."""
+        cached = None if fresh else self._cached(item_id)
+        if cached is not None and cached.fresh(self.cache.ttl):
+            return cached.item
+        r = self._request("GET", self.item_url(item_id), headers=_conditional_headers(cached))
+        return self._store(item_id, r, cached)
 
     @staticmethod
     def pretty_json(obj: dict) -> str:
-        return json.dumps(obj, sort_keys=True, indent=4, ensure_ascii=False)
+        return pretty(obj)
 
     def get_metadata(self, item_id: str) -> dict:
         return self.get_item_json(item_id).get("metadata", {})
 
+    def get_record(self, item_id: str, fresh: bool = False) -> ItemRecord:
+        return ItemRecord.from_item(self.get_item_json(item_id, fresh), item_id)
+
+    def search_items(self, query: str = "*", scope: str | None = None, page_size: int = 100,
+                     sort: str | None = None) -> Iterator[dict]:
+        """Page through discovery (``/server/api/discover/search/objects``) yielding item JSON.
+
+        ``scope`` limits the search to a collection or community UUID; ``sort``
+        is a discovery sort such as ``"lastModified,ASC"``.
+        """
+        params: dict[str, str | int] = {"query": query, "dsoType": "ITEM", "size": page_size, "page": 0}
+        if scope is not None:
+            params["scope"] = scope
+        if sort is not None:
+            params["sort"] = sort
+        url = urljoin(self.repository, "server/api/discover/search/objects")
+        while True:
+            r = self._request("GET", url, params=params)
+            r.raise_for_status()
+            result = loads(r.content)["_embedded"]["searchResult"]
+            for obj in result.get("_embedded", {}).get("objects", []):
+                yield obj["_embedded"]["indexableObject"]
+            page = result.get("page", {})
+            if page.get("number", 0) + 1 >= page.get("totalPages", 0):
+                return
+            params["page"] = page["number"] + 1
+
+    def iter_collection_items(self, collection_id: str, page_size: int = 100) -> Iterator[dict]:
+        return self.search_items(scope=collection_id, page_size=page_size)
+
+    def get_items_bulk(self, item_ids: Iterable[str], chunk_size: int = 50) -> dict[str, dict]:
+        """Fetch many items with one discovery query per ``chunk_size`` UUIDs.
+
+        Only the items discovery returns are in the result; the caller fetches
+        the rest (private, withdrawn, deleted, not yet indexed) one by one, so
+        a single missing UUID does not fail the others.
+        """
+        found: dict[str, dict] = {}
+        wanted = []
+        for item_id in dict.fromkeys(item_ids):
+            cached = self._cached(item_id)
+            if cached is not None and cached.fresh(self.cache.ttl):
+                found[item_id] = cached.item
+            else:
+                wanted.append(item_id)
+        for i in range(0, len(wanted), chunk_size):
+            chunk = wanted[i:i + chunk_size]
+            query = "search.resourceid:(" + " OR ".join(chunk) + ")"
+            for item in self.search_items(query, page_size=len(chunk)):
+                found[item["uuid"]] = item
+                if self.cache is not None:
+                    self._update_cache(
+                        lambda: self.cache.put(item["uuid"], dumps(item), last_modified=item.get("lastModified")))
+        return found
+
+    def patch_item(self, item_id: str, operations: list[dict]) -> dict:
+        """Apply JSON Patch ``operations``; the patched item DSpace returns replaces the cached copy."""
+        r = self._request("PATCH", self.item_url(item_id), json=operations)
+        return self._store(item_id, r, None)
+
     def close(self):
-        self.client.close()
\ No newline at end of file
+        self.client.close()
+
+
+def _token_expiry(bearer: str) -> float:
+    """``exp`` claim of a DSpace JWT (``Bearer <jwt>``), or 0 if it cannot be read."""
+    try:
+        payload = bearer.split(" ", 1)[-1].split(".")[1]
+        return float(loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))["exp"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return 0.0
+
+
+class DSpaceSession(OpenRepositoryClient):
+    """OpenRepositoryClient that logs in once and keeps the session valid.
+
+    The XSRF cookie/token pair comes from ``/server/api/security/csrf`` and is
+    updated whenever a response carries a rotated ``DSPACE-XSRF-TOKEN``. The
+    bearer token is refreshed ``refresh_margin`` seconds before it expires; a
+    401 (or a 403 from a stale XSRF token) triggers one re-login and retry.
+    All requests share the client's connection pool.
+    """
+
+    def __init__(self, repository: str, username: str, password: str, refresh_margin: float = 60.0, **kwargs):
+        super().__init__(repository, **kwargs)
+        self.username = username
+        self.password = password
+        self.refresh_margin = refresh_margin
+        self.expires_at = 0.0
+        self._auth_lock = threading.Lock()
+        self.client.event_hooks["response"].append(self._track_xsrf)
+
+    def _store_token(self, response: httpx.Response) -> None:
+        bearer = response.headers["Authorization"]
+        self.client.headers["Authorization"] = bearer
+        self.expires_at = _token_expiry(bearer)
+
+    def login(self) -> None:
+        with self._auth_lock:
+            self._login()
+
+    def _login(self) -> None:
+        self.client.headers.pop("Authorization", None)
+        self.client.get(self._api("security/csrf")).raise_for_status()
+        r = self.client.post(self._api("authn/login"), data={"user": self.username, "password": self.password})
+        r.raise_for_status()
+        self._store_token(r)
+
+    def _token_fresh(self) -> bool:
+        if "Authorization" not in self.client.headers:
+            return False
+        # without a readable expiry, trust the token until the server rejects it
+        return not self.expires_at or time.time() < self.expires_at - self.refresh_margin
+
+    def _ensure_auth(self) -> None:
+        if self._token_fresh():
+            return
+        with self._auth_lock:
+            # another thread may have refreshed while we waited
+            if self._token_fresh():
+                return
+            if "Authorization" in self.client.headers and time.time() < self.expires_at:
+                # a still-valid token can be exchanged for a fresh one without credentials
+                r = self.client.post(self._api("authn/login"))
+                if r.is_success and "Authorization" in r.headers:
+                    self._store_token(r)
+                    return
+            self._login()
+
+    def _rejected(self, response: httpx.Response) -> bool:
+        if response.status_code == 401:
+            return True
+        return response.status_code == 403 and "csrf" in response.text.lower()
+
+    def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        self._ensure_auth()
+        bearer = self.client.headers.get("Authorization")
+        r = self.client.request(method, url, **kwargs)
+        if self._rejected(r):
+            with self._auth_lock:
+                # only the first thread to see the stale token logs in again
+                if self.client.headers.get("Authorization") == bearer:
+                    self._login()
+            r = self.client.request(method, url, **kwargs)
+        return r
+
+    def logout(self) -> None:
+        if "Authorization" in self.client.headers:
+            self.client.post(self._api("authn/logout"))
+            self.client.headers.pop("Authorization", None)
+
+    def close(self):
+        try:
+            self.logout()
+        except httpx.HTTPError:
+            pass
+        super().close()
+
+
+class AsyncOpenRepositoryClient(_RepositoryBase):
+    """asyncio counterpart of :class:`OpenRepositoryClient` for high fan-out reads.
+
+    ``http2=True`` needs the optional ``h2`` package (``pip install httpx[http2]``).
+    With a ``cache`` items are reused and revalidated like the sync client does.
+    After :meth:`login` requests carry the bearer and XSRF tokens as in
+    :class:`DSpaceSession`, so embargoed, private and in-workflow items can be
+    read; a 401 logs in again once.
+    """
+
+    def __init__(
+        self,
+        repository: str,
+        timeout: float = 30.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        cache: ItemCache | None = None,
+    ):
+        super().__init__(repository, cache)
+        self.max_connections = max_connections
+        self.client = httpx.AsyncClient(
+            timeout=timeout,
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive_connections,
+                keepalive_expiry=keepalive_expiry,
+            ),
+            event_hooks={"response": [self._on_response]},
+        )
+        self._credentials: tuple[str, str] | None = None
+        self._auth_lock = asyncio.Lock()
+
+    async def _on_response(self, response: httpx.Response) -> None:
+        self._track_xsrf(response)
+
+    async def login(self, username: str, password: str) -> None:
+        self._credentials = (username, password)
+        await self._login()
+
+    async def _login(self) -> None:
+        self.client.headers.pop("Authorization", None)
+        (await self.client.get(self._api("security/csrf"))).raise_for_status()
+        user, password = self._credentials
+        r = await self.client.post(self._api("authn/login"), data={"user": user, "password": password})
+        r.raise_for_status()
+        self.client.headers["Authorization"] = r.headers["Authorization"]
+
+    async def _get(self, url: str, **kwargs) -> httpx.Response:
+        bearer = self.client.headers.get("Authorization")
+        r = await self.client.get(url, **kwargs)
+        if r.status_code == 401 and self._credentials is not None:
+            async with self._auth_lock:
+                # only the first task to see the expired token logs in again
+                if self.client.headers.get("Authorization") == bearer:
+                    await self._login()
+            r = await self.client.get(url, **kwargs)
+        return r
+
+    async def get_item_json(self, item_id: str) -> dict:
+        cached = self._cached(item_id)
+        if cached is not None and cached.fresh(self.cache.ttl):
+            return cached.item
+        r = await self._get(self.item_url(item_id), headers=_conditional_headers(cached))
+        return self._store(item_id, r, cached)
+
+    async def get_metadata(self, item_id: str) -> dict:
+        return (await self.get_item_json(item_id)).get("metadata", {})
+
+    async def get_record(self, item_id: str) -> ItemRecord:
+        return ItemRecord.from_item(await self.get_item_json(item_id), item_id)
+
+    async def get_many(
+        self, item_ids: Iterable[str], concurrency: int | None = None
+    ) -> AsyncIterator[tuple[str, dict | Exception]]:
+        """Yield ``(item_id, item_json)`` in completion order.
+
+        At most ``concurrency`` requests (default: the pool size) are in flight;
+        ids are pulled from ``item_ids`` lazily. A failed fetch yields the
+        exception in place of the JSON rather than aborting the iteration.
+        """
+        limit = max(1, concurrency or self.max_connections)
+        ids = iter(item_ids)
+        running: dict[asyncio.Task, str] = {}
+
+        def fill() -> None:
+            for item_id in ids:
+                running[asyncio.ensure_future(self.get_item_json(item_id))] = item_id
+                if len(running) >= limit:
+                    break
+
+        fill()
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    item_id = running.pop(task)
+                    exc = task.exception()
+                    yield item_id, exc if exc is not None else task.result()
+                fill()
+        finally:
+            for task in running:
+                task.cancel()
+
+    async def aclose(self):
+        if "Authorization" in self.client.headers:
+            try:
+                await self.client.post(self._api("authn/logout"))
+            except httpx.HTTPError:
+                pass
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
@@ -0,0 +1,149 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from jsonCodec import loads
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    item_id TEXT PRIMARY KEY,
+    digest TEXT NOT NULL REFERENCES blobs(digest),
+    etag TEXT,
+    last_modified TEXT,
+    validated_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_accessed ON items(accessed_at);
+CREATE INDEX IF NOT EXISTS items_digest ON items(digest);
+-- running total of blobs.size, kept in step by put and eviction so neither has to sum the bodies
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    bytes INTEGER NOT NULL
+);
+"""
+
+
+@dataclass
+class CachedItem:
+    item: dict
+    etag: str | None
+    last_modified: str | None
+    validated_at: float
+
+    def fresh(self, ttl: float) -> bool:
+        return time.time() - self.validated_at < ttl
+
+
+class ItemCache:
+    """SQLite-backed store of raw item JSON keyed by item UUID.
+
+    Bodies are stored once per SHA-256 digest so unchanged items revalidated
+    with a new ETag do not duplicate data. ``ttl`` is how long an entry is
+    trusted without a conditional GET; ``max_bytes`` bounds the total body
+    size, evicting least recently used items first. The total is kept in the
+    database, so shard processes sharing the cache see the same figure.
+    """
+
+    def __init__(self, path: Path, ttl: float = 86400.0, max_bytes: int = 512 * 1024 * 1024):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                if self._db.execute("SELECT 1 FROM usage").fetchone() is None:
+                    # a cache from before the running total: count it once
+                    self._db.execute("DELETE FROM blobs WHERE digest NOT IN (SELECT digest FROM items)")
+                    self._db.execute("INSERT INTO usage (id, bytes) SELECT 0, COALESCE(SUM(size), 0) FROM blobs")
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def get(self, item_id: str) -> CachedItem | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT b.body, i.etag, i.last_modified, i.validated_at"
+                " FROM items i JOIN blobs b ON b.digest = i.digest WHERE i.item_id = ?",
+                (item_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE items SET accessed_at = ? WHERE item_id = ?", (time.time(), item_id))
+        body, etag, last_modified, validated_at = row
+        return CachedItem(loads(body), etag, last_modified, validated_at)
+
+    def put(self, item_id: str, body: bytes, etag: str | None = None, last_modified: str | None = None) -> None:
+        digest = hashlib.sha256(body).hexdigest()
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                previous = self._db.execute("SELECT digest FROM items WHERE item_id = ?", (item_id,)).fetchone()
+                added = self._db.execute(
+                    "INSERT OR IGNORE INTO blobs (digest, body, size) VALUES (?, ?, ?)", (digest, body, len(body))
+                ).rowcount
+                if added:
+                    self._db.execute("UPDATE usage SET bytes = bytes + ?", (len(body),))
+                self._db.execute(
+                    "INSERT OR REPLACE INTO items (item_id, digest, etag, last_modified, validated_at, accessed_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (item_id, digest, etag, last_modified, now, now),
+                )
+                if previous is not None and previous[0] != digest:
+                    self._drop_unused([previous[0]])
+                self._evict()
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                # e.g. "database is locked" by another shard; leave the connection usable
+                self._db.execute("ROLLBACK")
+                raise
+
+    def touch(self, item_id: str) -> None:
+        """Mark an entry as revalidated (the server answered 304)."""
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE items SET validated_at = ?, accessed_at = ? WHERE item_id = ?", (now, now, item_id)
+            )
+
+    def _drop_unused(self, digests: list[str]) -> None:
+        for digest in digests:
+            if self._db.execute("SELECT 1 FROM items WHERE digest = ?", (digest,)).fetchone() is None:
+                row = self._db.execute("DELETE FROM blobs WHERE digest = ? RETURNING size", (digest,)).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE usage SET bytes = bytes - ?", row)
+
+    def _evict(self) -> None:
+        (total,) = self._db.execute("SELECT bytes FROM usage").fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT i.item_id, i.digest, b.size FROM items i JOIN blobs b ON b.digest = i.digest"
+            " ORDER BY i.accessed_at"
+        )
+        victims, digests = [], []
+        for item_id, digest, size in rows:
+            if total <= self.max_bytes:
+                break
+            victims.append((item_id,))
+            digests.append(digest)
+            total -= size
+        self._db.executemany("DELETE FROM items WHERE item_id = ?", victims)
+        self._drop_unused(digests)
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,49 @@
+from dataclasses import dataclass
+
+# the metadata fields the DataCite transform, the checks and the runner read
+FIELDS = (
+    "dc.contributor.author",
+    "dc.date.issued",
+    "dc.description.abstract",
+    "dc.identifier.doi",
+    "dc.identifier.orcid",
+    "dc.identifier.uri",
+    "dc.publisher",
+    "dc.title",
+    "dc.type",
+)
+
+
+def _compact(values: list[dict]) -> list[dict]:
+    compact = []
+    for i, v in enumerate(values):
+        value = {"value": v["value"], "place": v.get("place", i)}
+        if v.get("authority"):
+            value["authority"] = v["authority"]
+        compact.append(value)
+    return compact
+
+
+@dataclass(slots=True)
+class ItemRecord:
+    """The part of a DSpace item that minting needs.
+
+    ``metadata`` keeps the DSpace shape (``{field: [{"value", "place",
+    "authority"}]}``) so :func:`dataciteTransform.to_datacite` reads it as
+    is, but only for :data:`FIELDS` and without ``language``/``confidence``;
+    ``_links``, ``_embedded`` and fields such as ``dc.description.provenance``
+    are dropped as soon as the item is decoded.
+    """
+
+    uuid: str
+    metadata: dict[str, list[dict]]
+    last_modified: str | None = None
+
+    @classmethod
+    def from_item(cls, item: dict, item_id: str | None = None) -> "ItemRecord":
+        metadata = item.get("metadata", {})
+        return cls(
+            item.get("uuid") or item_id,
+            {key: _compact(metadata[key]) for key in FIELDS if metadata.get(key)},
+            item.get("lastModified"),
+        )
@@ -0,0 +1,26 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # the standard library is used without it
+    orjson = None
+
+BACKEND = "orjson" if orjson is not None else "json"
+
+
+def loads(data: bytes | str):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> bytes:
+    """Compact UTF-8 JSON, for request bodies and the run's files."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def pretty(obj) -> str:
+    """Indented, key-sorted JSON for people to read; keep it off the per-item path."""
+    return json.dumps(obj, sort_keys=True, indent=4, ensure_ascii=False)
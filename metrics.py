@@ -0,0 +1,261 @@
+import bisect
+import json
+import random
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+import httpx
+
+try:
+    from opentelemetry import trace
+except ImportError:  # tracing is optional
+    trace = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labels)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, value: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self.values)
+        return [f"{self.name}{_labels(self.labels, k)} {v:g}" for k, v in sorted(values.items())]
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [{"labels": dict(zip(self.labels, k)), "value": v} for k, v in sorted(self.values.items())]
+
+
+class Gauge(_Metric):
+    """A gauge read at scrape time from ``collect()``: ``{label values: value}``."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (),
+                 collect: Callable[[], dict[tuple[str, ...], float]] | None = None):
+        super().__init__(name, help, labels)
+        self.collect = collect or dict
+
+    def render(self) -> list[str]:
+        return [f"{self.name}{_labels(self.labels, k)} {v:g}" for k, v in sorted(self.collect().items())]
+
+    def snapshot(self) -> list[dict]:
+        return [{"labels": dict(zip(self.labels, k)), "value": v} for k, v in sorted(self.collect().items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = buckets
+        # per label set: [count per bucket (last = +Inf)], sum
+        self.values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self.values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def render(self) -> list[str]:
+        lines = []
+        with self._lock:
+            values = {k: (list(c), t[0]) for k, (c, t) in self.values.items()}
+        names = self.labels + ("le",)
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_labels(names, key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total:g}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [
+                {"labels": dict(zip(self.labels, k)), "count": sum(c), "sum": round(t[0], 6),
+                 "buckets": {("+Inf" if b == float("inf") else f"{b:g}"): n
+                             for b, n in zip(self.buckets + (float("inf"),), c)}}
+                for k, (c, t) in sorted(self.values.items())
+            ]
+
+
+class RunMetrics:
+    """Counters and histograms of one batch run.
+
+    HTTP clients are instrumented through response event hooks
+    (:meth:`instrument`), which record requests by status, latency and bytes
+    per service. The runner reports stage timings, retries and outcomes.
+    ``render`` gives the Prometheus text format, ``snapshot`` a JSON-able dict.
+    """
+
+    def __init__(self):
+        self.requests = Counter("mintdoi_http_requests_total", "HTTP requests by service, method and status",
+                                ("service", "method", "status"))
+        self.latency = Histogram("mintdoi_http_request_seconds", "HTTP request latency", ("service", "method"))
+        self.bytes = Counter("mintdoi_http_bytes_total", "HTTP body bytes sent and received",
+                             ("service", "direction"))
+        self.stage_items = Counter("mintdoi_stage_items_total", "Items handled per pipeline stage",
+                                   ("stage", "outcome"))
+        self.stage_seconds = Histogram("mintdoi_stage_seconds", "Time an item spends in a stage's handler",
+                                       ("stage",))
+        self.retries = Counter("mintdoi_retries_total", "Items scheduled for a retry, by stage", ("stage",))
+        self.items = Counter("mintdoi_items_total", "Finished items by outcome", ("outcome",))
+        self.failures = Counter("mintdoi_failures_total", "Failed items by stage and kind of error", ("stage", "kind"))
+        self.queue_depth = Gauge("mintdoi_queue_depth", "Items waiting in each stage's queue", ("stage",))
+        self.metrics: list[_Metric] = [self.requests, self.latency, self.bytes, self.stage_items,
+                                       self.stage_seconds, self.retries, self.items, self.failures, self.queue_depth]
+        self.started = time.time()
+
+    def instrument(self, client: httpx.Client, service: str) -> None:
+        def on_request(request: httpx.Request) -> None:
+            request.extensions["mintdoi.start"] = time.monotonic()
+
+        def on_response(response: httpx.Response) -> None:
+            # read here so the latency covers the body; the client reads it anyway
+            response.read()
+            request = response.request
+            start = request.extensions.get("mintdoi.start")
+            if start is not None:
+                self.latency.observe(time.monotonic() - start, service=service, method=request.method)
+            self.requests.inc(service=service, method=request.method, status=str(response.status_code))
+            self.bytes.inc(len(request.content), service=service, direction="sent")
+            self.bytes.inc(len(response.content), service=service, direction="received")
+
+        client.event_hooks["request"].append(on_request)
+        client.event_hooks["response"].append(on_response)
+
+    def observe_stage(self, stage: str, seconds: float, ok: bool) -> None:
+        self.stage_seconds.observe(seconds, stage=stage)
+        self.stage_items.inc(stage=stage, outcome="ok" if ok else "error")
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += metric.header() + metric.render()
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        return {
+            "started": self.started,
+            "elapsed_s": round(time.time() - self.started, 3),
+            "metrics": {m.name: {"type": m.kind, "help": m.help, "samples": m.snapshot()} for m in self.metrics},
+        }
+
+    def write_json(self, path, **extra) -> None:
+        path.write_text(json.dumps(self.snapshot() | extra, indent=2), encoding="utf-8")
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves ``GET /metrics`` on ``host:port`` from a daemon thread."""
+
+    daemon_threads = True
+
+    def __init__(self, metrics: RunMetrics, port: int, host: str = "127.0.0.1"):
+        super().__init__((host, port), _MetricsHandler)
+        self.metrics = metrics
+
+    def start(self) -> "MetricsServer":
+        threading.Thread(target=self.serve_forever, name="metrics-server", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class ItemTracer:
+    """One OpenTelemetry trace per item, with a child span per stage.
+
+    ``rate`` is the share of items traced. Only the OpenTelemetry API is used;
+    exporting is set up by the OpenTelemetry SDK (e.g. by running under
+    ``opentelemetry-instrument``). Without the API installed nothing is traced.
+    """
+
+    def __init__(self, rate: float = 0.0):
+        self.rate = rate if trace is not None else 0.0
+        self.tracer = trace.get_tracer("mintdoi") if self.rate > 0 else None
+
+    @property
+    def enabled(self) -> bool:
+        return self.tracer is not None
+
+    def start_item(self, item_id: str):
+        if self.tracer is None or random.random() >= self.rate:
+            return None
+        return self.tracer.start_span("mintdoi.item", attributes={"mintdoi.item_id": item_id})
+
+    def stage(self, parent, name: str):
+        if parent is None:
+            return nullcontext()
+        return self.tracer.start_as_current_span(f"mintdoi.{name}", context=trace.set_span_in_context(parent))
+
+    @staticmethod
+    def end_item(span, error: str | None = None, **attributes) -> None:
+        if span is None:
+            return
+        for key, value in attributes.items():
+            if value is not None:
+                span.set_attribute(f"mintdoi.{key}", value)
+        if error:
+            span.set_status(trace.Status(trace.StatusCode.ERROR, error))
+        span.end()
@@ -0,0 +1,126 @@
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+_STOP = object()
+
+
+@dataclass
+class StageStats:
+    """Counters of one pipeline stage; updated by its workers under ``lock``."""
+
+    name: str
+    workers: int
+    capacity: int
+    processed: int = 0
+    failed: int = 0
+    busy: float = 0.0
+    blocked: float = 0.0
+    depth_total: int = 0
+    depth_samples: int = 0
+    max_depth: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def sample(self, depth: int) -> None:
+        with self.lock:
+            self.depth_total += depth
+            self.depth_samples += 1
+            self.max_depth = max(self.max_depth, depth)
+
+    def record(self, busy: float, blocked: float, ok: bool) -> None:
+        with self.lock:
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+            self.busy += busy
+            self.blocked += blocked
+
+    @property
+    def avg_depth(self) -> float:
+        return self.depth_total / self.depth_samples if self.depth_samples else 0.0
+
+    def utilization(self, elapsed: float) -> float:
+        """Share of the stage's worker time spent in its handler."""
+        return self.busy / (self.workers * elapsed) if elapsed else 0.0
+
+    def describe(self, elapsed: float, depth: int | None = None) -> str:
+        rate = self.processed / elapsed if elapsed else 0.0
+        depth_text = f"queue {depth}/{self.capacity}, " if depth is not None else ""
+        return (f"{self.name:<10} {self.processed:>7} done {self.failed:>5} failed  {rate:8.2f}/s  "
+                f"{depth_text}avg queue {self.avg_depth:.1f} (max {self.max_depth}), "
+                f"busy {self.utilization(elapsed):.0%}, blocked {self.blocked:.1f}s")
+
+
+class Stage(Generic[T]):
+    """A pool of ``workers`` threads applying ``handler`` to items from a bounded queue.
+
+    ``put`` blocks while the queue holds ``capacity`` items, which is what
+    pushes back on the stage in front. After each item, ``route(stage, item,
+    error)`` decides where it goes next; time spent there (usually waiting for
+    room in the next stage's queue) is counted as ``blocked``. ``observe``, if
+    given, is told the stage name, handler time and success of every item.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[T], None],
+        route: Callable[["Stage[T]", T, Exception | None], None],
+        workers: int = 1,
+        capacity: int | None = None,
+        observe: Callable[[str, float, bool], None] | None = None,
+    ):
+        self.name = name
+        self.handler = handler
+        self.route = route
+        self.observe = observe
+        self.workers = max(1, workers)
+        capacity = capacity or self.workers * 2
+        self.queue: queue.Queue = queue.Queue(maxsize=capacity)
+        self.stats = StageStats(name, self.workers, capacity)
+        self._threads: list[threading.Thread] = []
+
+    @property
+    def depth(self) -> int:
+        return self.queue.qsize()
+
+    def put(self, item: T) -> None:
+        self.queue.put(item)
+
+    def start(self) -> "Stage[T]":
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def _work(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                return
+            self.stats.sample(self.queue.qsize())
+            start = time.monotonic()
+            try:
+                self.handler(item)
+                error = None
+            except Exception as e:
+                error = e
+            handled = time.monotonic()
+            if self.observe is not None:
+                self.observe(self.name, handled - start, error is None)
+            self.route(self, item, error)
+            self.stats.record(handled - start, time.monotonic() - handled, error is None)
+
+    def stop(self) -> None:
+        """Let the workers finish what is queued, then end them."""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+        self._threads.clear()
@@ -0,0 +1,116 @@
+import asyncio
+import sys
+import time
+from collections import Counter
+from typing import TYPE_CHECKING
+
+import httpx
+
+from csvReader import stream_item_ids
+from dataciteClient import DataCiteClient
+from dataciteTransform import DataCiteConfig, to_datacite, unmatched_orcids
+from getDataFromRepo import AsyncOpenRepositoryClient
+from itemCache import ItemCache
+from resourceTypes import ResourceTypeMap, report_unknown_types
+
+if TYPE_CHECKING:
+    from CLI import ParsedArgs
+
+REQUIRED_FIELDS = ("dc.title", "dc.date.issued", "dc.publisher", "dc.identifier.uri", "dc.contributor.author")
+
+
+def check_item(metadata: dict, config: DataCiteConfig) -> list[tuple[str, str]]:
+    """``(kind, message)`` for every problem ``run`` would hit or should not ignore for this item."""
+    issues = []
+    missing = [key for key in REQUIRED_FIELDS if not metadata.get(key)]
+    if missing:
+        issues.append(("missing", "missing " + ", ".join(missing)))
+    dc_type = metadata.get("dc.type")
+    if dc_type and dc_type[0]["value"] not in config.resource_types:
+        issues.append(("type", f"unknown dc.type {dc_type[0]['value']!r}"))
+    unmatched = unmatched_orcids(metadata)
+    if unmatched:
+        issues.append(("orcid", "ORCID(s) not matched to an author: " + ", ".join(unmatched)))
+    doi = metadata.get("dc.identifier.doi")
+    if doi:
+        issues.append(("doi", f"already has DOI {doi[0]['value']}"))
+    if not missing:
+        try:
+            to_datacite(metadata, config)
+        except Exception as e:
+            issues.append(("transform", f"transform failed: {type(e).__name__}: {e}"))
+    return issues
+
+
+def _check_datacite(args: "ParsedArgs") -> bool:
+    if not args.datacite_token:
+        print("DataCite auth: no token given", file=sys.stderr)
+        return False
+    datacite = DataCiteClient(args.datacite_base, args.datacite_token)
+    try:
+        datacite.check_auth(args.prefix)
+    except httpx.HTTPError as e:
+        print(f"DataCite auth: FAILED {e}", file=sys.stderr)
+        return False
+    finally:
+        datacite.close()
+    print("DataCite auth: OK", file=sys.stderr)
+    return True
+
+
+async def _check_items(args: "ParsedArgs", config: DataCiteConfig, cache: ItemCache | None) -> Counter[str]:
+    counts: Counter[str] = Counter()
+    concurrency = args.fetch_concurrency or args.repo_concurrency
+    ids = stream_item_ids(str(p) for p in args.data_location.values())
+    async with AsyncOpenRepositoryClient(args.repo_url, max_connections=concurrency,
+                                         max_keepalive_connections=concurrency, cache=cache) as repo:
+        if args.repo_user and args.repo_password:
+            # read the items as run does: anonymous reads miss embargoed, private and in-workflow items
+            try:
+                await repo.login(args.repo_user, args.repo_password)
+            except httpx.HTTPError as e:
+                print(f"Repository login: FAILED {e}", file=sys.stderr)
+                counts["login"] += 1
+                return counts
+            print("Repository login: OK", file=sys.stderr)
+        async for item_id, item in repo.get_many(ids, concurrency):
+            if isinstance(item, Exception):
+                issues = [("fetch", f"fetch failed: {type(item).__name__}: {item}")]
+            else:
+                issues = check_item(item.get("metadata", {}), config)
+            counts["items"] += 1
+            if issues:
+                counts["problems"] += 1
+                counts.update(kind for kind, _ in issues)
+                print(f"{item_id}: " + "; ".join(message for _, message in issues))
+    return counts
+
+
+def run_check(args: "ParsedArgs", resource_types: ResourceTypeMap) -> int:
+    """Fetch and dry-run transform every item of the batch without minting; 1 if anything needs attention."""
+    config = DataCiteConfig(
+        prefix=args.prefix,
+        repository=args.repo_url,
+        affiliation_name=args.affiliation_name,
+        affiliation_ror=args.affiliation_ror,
+        resource_types=resource_types,
+    )
+    auth_ok = _check_datacite(args)
+    cache = ItemCache(args.cache_path, ttl=args.cache_ttl, max_bytes=args.cache_max_mb * 1024 * 1024) \
+        if args.cache_path is not None else None
+    start = time.monotonic()
+    try:
+        counts = asyncio.run(_check_items(args, config, cache))
+    finally:
+        if cache is not None:
+            cache.close()
+    elapsed = time.monotonic() - start
+
+    report_unknown_types(resource_types)
+    rate = counts["items"] / elapsed if elapsed else 0.0
+    print(f"checked {counts['items']} items in {elapsed:.1f}s ({rate:.2f} items/s), "
+          f"{counts['problems']} with problems", file=sys.stderr)
+    for kind in ("fetch", "missing", "transform", "type", "orcid", "doi"):
+        if counts[kind]:
+            print(f"  {kind:<10} {counts[kind]:>6}", file=sys.stderr)
+    return 0 if auth_ok and not counts["problems"] and not counts["login"] else 1
@@ -0,0 +1,295 @@
+import heapq
+import itertools
+from collections import deque
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, TypeVar
+
+import httpx
+
+if TYPE_CHECKING:
+    from pipeline import Stage
+
+T = TypeVar("T")
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Thread-safe token bucket; ``rate`` tokens are added per second up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        # a non-positive rate disables limiting
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """Token bucket whose rate follows AIMD feedback from the service.
+
+    Starts at ``max_rate`` (the configured budget). A throttle signal (429/503)
+    multiplies the rate by ``decrease`` at most once per ``cooldown`` seconds
+    and honors ``Retry-After`` by pausing every caller; each success adds
+    ``increase / rate`` so the rate climbs back by about ``increase`` req/s
+    per second. A service with no budget (``max_rate`` 0) is not limited until
+    its first throttle; the rate then starts from the request rate seen
+    just before it and climbs back without a cap. With ``latency_target``
+    set, a latency EWMA above it counts as a mild congestion signal.
+    """
+
+    def __init__(
+        self,
+        max_rate: float,
+        min_rate: float = 0.2,
+        increase: float = 0.5,
+        decrease: float = 0.5,
+        latency_target: float | None = None,
+        cooldown: float = 1.0,
+    ):
+        super().__init__(max_rate)
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate) if max_rate > 0 else min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.latency_ewma: float | None = None
+        self.throttled = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        # recent request times while unlimited, to know the rate a first throttle hit
+        self._recent: deque[float] = deque(maxlen=64)
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        wait = self._paused_until - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        if self.rate <= 0:
+            self._recent.append(time.monotonic())
+        super().acquire(tokens)
+
+    def _observed_rate(self) -> float:
+        recent = list(self._recent)
+        span = recent[-1] - recent[0] if len(recent) > 1 else 0.0
+        return (len(recent) - 1) / span if span > 0 else self.min_rate
+
+    def _decrease(self, factor: float, now: float) -> None:
+        if now - self._last_decrease < self.cooldown:
+            return
+        if self.rate <= 0:
+            # unlimited so far: limit from here on, starting at the rate that drew the throttle
+            self.rate = max(self.min_rate, self._observed_rate())
+            self.max_rate = float("inf")
+            self.capacity = max(1.0, self.rate)
+            self._tokens = self.capacity
+            self._updated = now
+        self._refill(now)
+        self.rate = max(self.min_rate, self.rate * factor)
+        self._tokens = min(self._tokens, self.rate)
+        self._last_decrease = now
+
+    def on_success(self, latency: float) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            if self.latency_target is not None and self.latency_ewma > self.latency_target:
+                self._decrease(0.9, now)
+            elif 0 < self.rate < self.max_rate:
+                self._refill(now)
+                self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self, retry_after: float | None = None) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self.throttled += 1
+            self._decrease(self.decrease, now)
+            if retry_after:
+                self._paused_until = max(self._paused_until, now + retry_after)
+
+
+class RateLimiters:
+    """One :class:`AdaptiveRateLimiter` per service name, created on first use.
+
+    Keyed by service rather than host, so two services behind one host keep
+    their own budgets and AIMD state.
+    """
+
+    def __init__(self, rates: dict[str, float] | None = None, default_rate: float = 0.0, **limiter_kwargs):
+        self.rates = rates or {}
+        self.default_rate = default_rate
+        self.limiter_kwargs = limiter_kwargs
+        self._limiters: dict[str, AdaptiveRateLimiter] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, service: str) -> AdaptiveRateLimiter:
+        limiter = self._limiters.get(service)
+        if limiter is None:
+            with self._lock:
+                limiter = self._limiters.setdefault(
+                    service, AdaptiveRateLimiter(self.rates.get(service, self.default_rate), **self.limiter_kwargs)
+                )
+        return limiter
+
+    def items(self):
+        return self._limiters.items()
+
+
+class RetryBudget:
+    """Caps retries at ``ratio`` of all requests (plus ``minimum``) so a failing
+    service is not hit with a retry storm."""
+
+    def __init__(self, ratio: float = 0.2, minimum: int = 10):
+        self.ratio = ratio
+        self.minimum = minimum
+        self.requests = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def record_request(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self.retries >= self.minimum + self.ratio * self.requests:
+                return False
+            self.retries += 1
+            return True
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 60.0, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff, never shorter than ``retry_after``."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    return max(delay, retry_after or 0.0)
+
+
+class DelayedQueue:
+    """Min-heap of items that become ready at a monotonic time."""
+
+    def __init__(self):
+        self._heap: list[tuple[float, int, object]] = []
+        self._seq = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, item: object, delay: float) -> None:
+        heapq.heappush(self._heap, (time.monotonic() + delay, next(self._seq), item))
+
+    def pop_ready(self) -> object | None:
+        if self._heap and self._heap[0][0] <= time.monotonic():
+            return heapq.heappop(self._heap)[2]
+        return None
+
+    def next_delay(self) -> float | None:
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+
+def retry_after_seconds(response: httpx.Response) -> float | None:
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_retryable(e: Exception) -> bool:
+    if isinstance(e, httpx.HTTPStatusError):
+        return e.response.status_code in _RETRY_STATUS
+    return isinstance(e, httpx.TransportError)
+
+
+class RetryScheduler:
+    """Per-service rate limiting and delayed retries for the stages of a runner.
+
+    :meth:`call` sends a request through its service's limiter and feeds the
+    outcome back to it. An item that failed with a 429/5xx or connection
+    error gets another try while :meth:`can_retry` says so (fewer than
+    ``retry_count`` retries, room in the retry budget); :meth:`schedule`
+    parks it on a delayed queue with jittered backoff, honoring Retry-After,
+    so the worker is free meanwhile, and a scheduler thread puts it back on
+    its stage when it is due.
+    """
+
+    def __init__(self, limiters: RateLimiters, retry_count: int = 3, retry_budget: RetryBudget | None = None):
+        self.limiters = limiters
+        self.retry_count = retry_count
+        self.retry_budget = retry_budget or RetryBudget()
+        self._queue = DelayedQueue()
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+
+    def call(self, service: str, call: Callable[[], T]) -> T:
+        limiter = self.limiters[service]
+        limiter.acquire()
+        self.retry_budget.record_request()
+        start = time.monotonic()
+        try:
+            value = call()
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code in (429, 503):
+                limiter.on_throttle(retry_after_seconds(e.response))
+            raise
+        limiter.on_success(time.monotonic() - start)
+        return value
+
+    def can_retry(self, error: Exception, attempt: int) -> bool:
+        """True if an item that failed with ``error`` after ``attempt`` retries gets another; spends budget."""
+        return is_retryable(error) and attempt < self.retry_count and self.retry_budget.try_spend()
+
+    def schedule(self, stage: "Stage", item: object, attempt: int, error: Exception) -> None:
+        """Put ``item`` back on ``stage`` after the backoff for its ``attempt``-th retry."""
+        retry_after = retry_after_seconds(error.response) if isinstance(error, httpx.HTTPStatusError) else None
+        with self._cond:
+            self._queue.push((stage, item), backoff_delay(attempt, retry_after=retry_after))
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                entry = self._queue.pop_ready()
+                if entry is None:
+                    if self._stopping:
+                        return
+                    self._cond.wait(self._queue.next_delay())
+                    continue
+            stage, item = entry
+            stage.put(item)
+
+    def start(self) -> "RetryScheduler":
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="retries", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """End the scheduler thread; call it before stopping the stages it feeds."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,90 @@
+import sys
+import threading
+import tomllib
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+
+DEFAULT_PATH = Path(__file__).with_name("resource_types.toml")
+
+# DataCite Metadata Schema 4.5 resourceTypeGeneral vocabulary
+RESOURCE_TYPE_GENERAL = frozenset({
+    "Audiovisual", "Book", "BookChapter", "Collection", "ComputationalNotebook", "ConferencePaper",
+    "ConferenceProceeding", "DataPaper", "Dataset", "Dissertation", "Event", "Image", "Instrument",
+    "InteractiveResource", "Journal", "JournalArticle", "Model", "OutputManagementPlan", "PeerReview",
+    "PhysicalObject", "Preprint", "Report", "Service", "Software", "Sound", "Standard", "StudyRegistration",
+    "Text", "Workflow", "Other",
+})
+
+
+class ResourceTypeMap:
+    """``dc.type`` -> DataCite ``types`` lookup compiled from a mapping table.
+
+    Lookups of values missing from the table fall back to ``default`` and are
+    counted in :attr:`unknown` so a batch can report them at the end.
+    """
+
+    def __init__(self, table: dict[str, tuple[str, str | None]], default: str = "Text"):
+        self._types = {
+            dc_type: {"resourceTypeGeneral": general} if specific is None
+            else {"resourceTypeGeneral": general, "resourceType": specific}
+            for dc_type, (general, specific) in table.items()
+        }
+        self.default = default
+        self.unknown: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._types)
+
+    def __contains__(self, dc_type: str) -> bool:
+        return dc_type in self._types
+
+    def types(self, dc_type: str) -> dict:
+        found = self._types.get(dc_type)
+        if found is not None:
+            return dict(found)
+        with self._lock:
+            self.unknown[dc_type] += 1
+        return {"resourceTypeGeneral": self.default, "resourceType": dc_type}
+
+    @classmethod
+    def load(cls, path: Path = DEFAULT_PATH) -> "ResourceTypeMap":
+        """Read and validate a TOML mapping table; raises ``ValueError`` on a bad entry."""
+        with open(path, "rb") as f:
+            try:
+                raw = tomllib.load(f)
+            except tomllib.TOMLDecodeError as e:
+                raise ValueError(f"{path}: {e}") from None
+
+        default = raw.get("default", "Text")
+        if default not in RESOURCE_TYPE_GENERAL:
+            raise ValueError(f"{path}: default {default!r} is not a DataCite resourceTypeGeneral")
+        table: dict[str, tuple[str, str | None]] = {}
+        for dc_type, entry in raw.get("types", {}).items():
+            if not isinstance(entry, dict) or "general" not in entry:
+                raise ValueError(f"{path}: types.{dc_type!r} needs a 'general' value")
+            unknown_keys = entry.keys() - {"general", "type"}
+            if unknown_keys:
+                raise ValueError(f"{path}: types.{dc_type!r} has unknown keys {sorted(unknown_keys)}")
+            general = entry["general"]
+            if general not in RESOURCE_TYPE_GENERAL:
+                raise ValueError(f"{path}: types.{dc_type!r} general {general!r} is not a DataCite resourceTypeGeneral")
+            specific = entry.get("type", dc_type)
+            if not isinstance(specific, str):
+                raise ValueError(f"{path}: types.{dc_type!r} type must be a string")
+            table[dc_type] = (general, specific or None)
+        return cls(table, default)
+
+
+@lru_cache
+def default_map() -> ResourceTypeMap:
+    return ResourceTypeMap.load()
+
+
+def report_unknown_types(resource_types: ResourceTypeMap) -> None:
+    if not resource_types.unknown:
+        return
+    print(f"Unknown dc.type values (mapped to {resource_types.default}):", file=sys.stderr)
+    for dc_type, count in resource_types.unknown.most_common():
+        print(f"  {count:>6}  {dc_type}", file=sys.stderr)
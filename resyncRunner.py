@@ -0,0 +1,244 @@
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable
+
+from csvReader import stream_item_ids
+from dataciteClient import DataCiteClient
+from dataciteTransform import DataCiteConfig, to_datacite
+from doiIndex import bare_doi
+from getDataFromRepo import DSpaceSession, OpenRepositoryClient
+from pipeline import Stage
+from rateLimit import RateLimiters, RetryScheduler
+from resourceTypes import ResourceTypeMap, report_unknown_types
+from runJournal import RunJournal
+
+if TYPE_CHECKING:
+    from CLI import ParsedArgs
+
+
+def matches(wanted, current) -> bool:
+    """True if ``current`` already says everything ``wanted`` does.
+
+    DataCite returns fields of its own (``affiliationIdentifierScheme``,
+    ``schemaOrg``, ...) and drops empty strings, so dicts compare as subsets
+    and blanks equal missing values; lists must match item by item.
+    """
+    if isinstance(wanted, dict):
+        return isinstance(current, dict) and all(matches(v, current.get(k)) for k, v in wanted.items())
+    if isinstance(wanted, list):
+        return isinstance(current, list) and len(wanted) == len(current) and all(map(matches, wanted, current))
+    if wanted in ("", None):
+        return current in ("", None)
+    # publicationYear goes out as a string and comes back as a number
+    return wanted == current or str(wanted) == str(current)
+
+
+@dataclass
+class ResyncResult:
+    item_id: str
+    doi: str | None = None
+    changed: list[str] = field(default_factory=list)
+    published: bool = False
+    error: str | None = None
+
+
+@dataclass
+class _Job:
+    result: ResyncResult
+    attributes: dict | None = None
+    attempt: int = 0
+
+
+class ResyncRunner:
+    """Re-run the transform for items that already have a DOI and update DataCite where it differs.
+
+    A ``fetch`` stage reads each item and builds its attributes; an
+    ``update`` stage reads the DOI's record (``GET /dois/{id}``) and sends a
+    ``PUT`` with only the attributes that changed, plus ``event: publish``
+    when ``publish`` is set and the DOI is not findable yet. Records that
+    match are left alone. Calls go through the pooled clients and, as in
+    :class:`batchRunner.BatchRunner`, a :class:`rateLimit.RetryScheduler`:
+    per-service AIMD rate limits, and an item that fails with a 429/5xx or
+    connection error waits on the delayed-retry queue and goes back to the
+    stage that failed, up to ``retry_count`` times within the retry budget.
+    With ``dry_run`` the differences are only reported.
+    """
+
+    def __init__(
+        self,
+        repo: OpenRepositoryClient,
+        datacite: DataCiteClient,
+        config: DataCiteConfig,
+        *,
+        publish: bool = False,
+        dry_run: bool = False,
+        rps: float = 5.0,
+        repo_rps: float = 0.0,
+        concurrency: int = 2,
+        repo_concurrency: int = 2,
+        retry_count: int = 3,
+    ):
+        self.repo = repo
+        self.datacite = datacite
+        self.config = config
+        self.publish = publish
+        self.dry_run = dry_run
+        self.concurrency = concurrency
+        self.repo_concurrency = max(1, repo_concurrency)
+        self.limiters = RateLimiters({"datacite": rps, "dspace": repo_rps})
+        self.retries = RetryScheduler(self.limiters, retry_count)
+        self.counts: Counter[str] = Counter()
+        self.stages: dict[str, Stage[_Job]] = {}
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._on_result: Callable[[ResyncResult], None] | None = None
+
+    def _fetch(self, job: _Job) -> None:
+        item_id = job.result.item_id
+        metadata = self.retries.call("dspace", lambda: self.repo.get_record(item_id)).metadata
+        doi = metadata.get("dc.identifier.doi")
+        if doi:
+            job.result.doi = bare_doi(doi[0]["value"])
+        if job.result.doi is None:
+            raise ValueError("item has no DOI")
+        job.attributes = to_datacite(metadata, self.config)["data"]["attributes"]
+        del job.attributes["prefix"]
+
+    def _update(self, job: _Job) -> None:
+        result = job.result
+        current = self.retries.call("datacite", lambda: self.datacite.get_doi(result.doi))
+        changes = {key: value for key, value in job.attributes.items() if not matches(value, current.get(key))}
+        result.changed = sorted(changes)
+        result.published = self.publish and current.get("state") != "findable"
+        if (changes or result.published) and not self.dry_run:
+            event = "publish" if result.published else None
+            self.retries.call("datacite", lambda: self.datacite.update_doi(result.doi, changes, event))
+        # kept until here: a retry compares again against a fresh GET
+        job.attributes = None
+
+    def _route(self, stage: Stage[_Job], job: _Job, error: Exception | None) -> None:
+        if error is None and stage.name == "fetch":
+            self.stages["update"].put(job)
+            return
+        if error is not None and self.retries.can_retry(error, job.attempt):
+            job.attempt += 1
+            self.retries.schedule(stage, job, job.attempt, error)
+            return
+        result = job.result
+        if error is not None:
+            result.error = f"{type(error).__name__}: {error}"
+            outcome = "failed"
+        elif result.published:
+            outcome = "published"
+        else:
+            outcome = "updated" if result.changed else "unchanged"
+        with self._cond:
+            self.counts[outcome] += 1
+            if self._on_result is not None:
+                self._on_result(result)
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def run(self, targets: Iterable[tuple[str, str | None]],
+            on_result: Callable[[ResyncResult], None] | None = None) -> Counter[str]:
+        """Resync ``(item_id, doi)`` pairs; ``doi`` may be None when the item carries it."""
+        self._on_result = on_result
+        self.stages = {
+            "fetch": Stage("fetch", self._fetch, self._route, self.repo_concurrency),
+            "update": Stage("update", self._update, self._route, self.concurrency),
+        }
+        for stage in self.stages.values():
+            stage.start()
+        self.retries.start()
+        try:
+            for item_id, doi in targets:
+                with self._cond:
+                    self._in_flight += 1
+                self.stages["fetch"].put(_Job(ResyncResult(item_id, doi)))
+            with self._cond:
+                while self._in_flight:
+                    self._cond.wait()
+        finally:
+            self.retries.stop()
+            for stage in self.stages.values():
+                stage.stop()
+        return self.counts
+
+
+def _targets(args: "ParsedArgs") -> Iterator[tuple[str, str | None]]:
+    seen = set()
+    if args.from_run:
+        for item_id, state in RunJournal.read(args.run_directory / args.from_run).items():
+            if state.reached("minted"):
+                seen.add(item_id)
+                yield item_id, state.doi
+    if args.data is not None:
+        for item_id in stream_item_ids(str(p) for p in args.data_location.values()):
+            if item_id not in seen:
+                yield item_id, None
+
+
+def _report(result: ResyncResult, dry_run: bool, verbose: int) -> None:
+    if result.error:
+        print(f"{result.item_id}: FAILED {result.error}", file=sys.stderr)
+        return
+    verb = "would update" if dry_run else "updated"
+    actions = [f"{verb} " + ", ".join(result.changed)] if result.changed else []
+    if result.published:
+        actions.append("would publish" if dry_run else "published")
+    if actions:
+        print(f"{result.item_id} {result.doi}: " + "; ".join(actions))
+    elif verbose:
+        print(f"{result.item_id} {result.doi}: unchanged")
+
+
+def run_resync(args: "ParsedArgs", resource_types: ResourceTypeMap) -> int:
+    """``resync``/``publish``: bring the DataCite records of minted items in line with the repository."""
+    publish = args.command == "publish"
+    # no item cache: the point is to pick up metadata edited since the items were minted
+    if args.repo_user and args.repo_password:
+        repo = DSpaceSession(args.repo_url, args.repo_user, args.repo_password, max_connections=args.repo_concurrency)
+    else:
+        # anonymous reads only see public items
+        repo = OpenRepositoryClient(args.repo_url, max_connections=args.repo_concurrency)
+    datacite = DataCiteClient(args.datacite_base, args.datacite_token, max_connections=args.concurrency)
+    runner = ResyncRunner(
+        repo,
+        datacite,
+        DataCiteConfig(
+            prefix=args.prefix,
+            repository=args.repo_url,
+            affiliation_name=args.affiliation_name,
+            affiliation_ror=args.affiliation_ror,
+            resource_types=resource_types,
+        ),
+        publish=publish,
+        dry_run=args.dry_run,
+        rps=args.rps,
+        repo_rps=args.repo_rps,
+        concurrency=args.concurrency,
+        repo_concurrency=args.fetch_concurrency or args.repo_concurrency,
+        retry_count=args.retry_count,
+    )
+    start = time.monotonic()
+    try:
+        if isinstance(repo, DSpaceSession):
+            repo.login()
+        counts = runner.run(_targets(args),
+                            on_result=lambda result: _report(result, args.dry_run, args.verbose or 0))
+    finally:
+        datacite.close()
+        repo.close()
+    elapsed = time.monotonic() - start
+
+    report_unknown_types(resource_types)
+    total = sum(counts.values())
+    rate = total / elapsed if elapsed else 0.0
+    prefix = "dry run: " if args.dry_run else ""
+    print(f"{prefix}{counts['updated']} updated, {counts['published']} published, {counts['unchanged']} unchanged, "
+          f"{counts['failed']} failed in {elapsed:.1f}s ({rate:.2f} items/s)")
+    return 1 if counts["failed"] else 0
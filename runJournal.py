@@ -0,0 +1,170 @@
+import itertools
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from jsonCodec import dumps, loads
+
+STAGES = ("fetched", "transformed", "minted", "patched")
+_RANK = {stage: i for i, stage in enumerate(STAGES)}
+
+
+@dataclass
+class ItemState:
+    stage: str
+    doi: str | None = None
+    url: str | None = None
+
+    def reached(self, stage: str) -> bool:
+        return _RANK[self.stage] >= _RANK[stage]
+
+
+class RunJournal:
+    """Append-only JSONL write-ahead log of per-item stage checkpoints.
+
+    Records are buffered and written by a background thread every
+    ``flush_interval`` seconds (or ``flush_size`` records), then fsynced, so
+    many workers share one write. ``record(..., durable=True)`` wakes the
+    writer and blocks until the record is on disk; use it after a
+    non-idempotent step so a restart does not repeat it.
+    """
+
+    FILE_NAME = "journal.jsonl"
+
+    def __init__(self, path: Path, flush_interval: float = 0.2, flush_size: int = 256, run_id: str | None = None):
+        self.path = path
+        self.run_id = run_id or path.parent.name
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.state: dict[str, ItemState] = self._load(path)
+
+        self._buffer: list[str] = []
+        self._queued = 0
+        self._flushed = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._file = open(path, "a", encoding="utf-8")
+        if self._file.tell() and not self._ends_with_newline(path):
+            # terminate a torn last line so the next record starts cleanly
+            self._file.write("\n")
+        self._writer = threading.Thread(target=self._write_loop, name="journal-writer", daemon=True)
+        self._writer.start()
+
+    @staticmethod
+    def create_run(run_directory: Path) -> str:
+        """Create the directory of a new run; its id is the start time, plus ``-2``, ``-3``... when taken."""
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        run_directory.mkdir(parents=True, exist_ok=True)
+        for n in itertools.count(1):
+            # runs started in the same second (shards, an overlapping cron sync) each get their own
+            run_id = stamp if n == 1 else f"{stamp}-{n}"
+            try:
+                (run_directory / run_id).mkdir()
+            except FileExistsError:
+                continue
+            return run_id
+
+    @classmethod
+    def open(cls, run_directory: Path, run_id: str | None = None, shard: str | None = None,
+             **kwargs) -> "RunJournal":
+        """Start a new run, or reopen ``run_id`` to resume it.
+
+        With ``shard`` the journal lives in that subdirectory of the run,
+        which is created the first time the shard runs.
+        """
+        new = run_id is None
+        if new:
+            run_id = cls.create_run(run_directory)
+        directory = run_directory / run_id / (shard or "")
+        if not new and not (directory / cls.FILE_NAME).is_file():
+            if shard is None or not (run_directory / run_id).is_dir():
+                raise ValueError(f"no journal for run {run_id!r} in {run_directory}")
+        directory.mkdir(exist_ok=True)
+        return cls(directory / cls.FILE_NAME, run_id=run_id, **kwargs)
+
+    @classmethod
+    def read(cls, run_dir: Path) -> dict[str, ItemState]:
+        """Item states recorded by a run, merged across its shards; nothing is opened for writing."""
+        state: dict[str, ItemState] = {}
+        for path in sorted(run_dir.glob(f"**/{cls.FILE_NAME}")):
+            state.update(cls._load(path))
+        return state
+
+    @staticmethod
+    def _ends_with_newline(path: Path) -> bool:
+        with open(path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    @staticmethod
+    def _load(path: Path) -> dict[str, ItemState]:
+        state: dict[str, ItemState] = {}
+        if not path.exists():
+            return state
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = loads(line)
+                except ValueError:
+                    # a torn final line from a crash mid-write
+                    continue
+                prev = state.get(rec["item"])
+                if prev is None or not prev.reached(rec["stage"]):
+                    state[rec["item"]] = ItemState(
+                        rec["stage"],
+                        rec.get("doi", prev.doi if prev else None),
+                        rec.get("url", prev.url if prev else None),
+                    )
+        return state
+
+    def get(self, item_id: str) -> ItemState | None:
+        return self.state.get(item_id)
+
+    def record(self, item_id: str, stage: str, *, doi: str | None = None, url: str | None = None,
+               durable: bool = False) -> None:
+        rec = {"item": item_id, "stage": stage}
+        if doi is not None:
+            rec["doi"] = doi
+        if url is not None:
+            rec["url"] = url
+        line = dumps(rec).decode() + "\n"
+        with self._cond:
+            prev = self.state.get(item_id)
+            self.state[item_id] = ItemState(stage, doi or (prev.doi if prev else None),
+                                            url or (prev.url if prev else None))
+            self._buffer.append(line)
+            self._queued += 1
+            seq = self._queued
+            if durable or len(self._buffer) >= self.flush_size:
+                # records queued while the writer is busy share its next fsync
+                self._cond.notify_all()
+            if durable:
+                while self._flushed < seq:
+                    self._cond.wait()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._cond:
+                if not self._buffer and not self._closed:
+                    self._cond.wait(self.flush_interval)
+                lines, self._buffer = self._buffer, []
+                seq = self._queued
+                closed = self._closed
+            if lines:
+                self._file.writelines(lines)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            with self._cond:
+                self._flushed = seq
+                self._cond.notify_all()
+            if closed and not lines:
+                return
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._writer.join()
+        self._file.close()
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import multiprocessing
+import re
+import sys
+from collections.abc import Iterable, Iterator
+from dataclasses import replace
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from runJournal import RunJournal
+
+if TYPE_CHECKING:
+    from CLI import ParsedArgs
+
+_TOTALS = ("minted", "failed", "existing", "skipped")
+_SHARD_DIR = re.compile(r"shard-(\d+)-of-(\d+)")
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """``"i/N"`` -> ``(i, N)`` with ``0 <= i < N``."""
+    index, _, count = value.partition("/")
+    try:
+        shard = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"shard must look like i/N, got {value!r}") from None
+    if not 0 <= shard[0] < shard[1]:
+        raise ValueError(f"shard index must be in 0..{shard[1] - 1}, got {value!r}")
+    return shard
+
+
+def shard_name(shard: tuple[int, int]) -> str:
+    return f"shard-{shard[0]}-of-{shard[1]}"
+
+
+def shard_count(run_dir: Path) -> int:
+    """N of a run made with ``--shard I/N`` or ``--workers N``; 0 for an unsharded run."""
+    matches = (_SHARD_DIR.fullmatch(p.name) for p in run_dir.iterdir() if p.is_dir())
+    return max((int(m.group(2)) for m in matches if m), default=0)
+
+
+def shard_of(item_id: str, count: int) -> int:
+    # a stable hash: the same UUID lands in the same shard on every host and restart
+    return int.from_bytes(hashlib.blake2b(item_id.encode(), digest_size=8).digest(), "big") % count
+
+
+def select_shard(item_ids: Iterable[str], shard: tuple[int, int]) -> Iterator[str]:
+    index, count = shard
+    return (item_id for item_id in item_ids if shard_of(item_id, count) == index)
+
+
+def _run_shard(args: "ParsedArgs") -> int:
+    from batchRunner import run_batch
+    from resourceTypes import DEFAULT_PATH, ResourceTypeMap
+
+    run_dir = args.run_directory / args.resume
+    log = open(run_dir / f"{shard_name(args.shard)}.log", "a", encoding="utf-8", buffering=1)
+    sys.stdout = sys.stderr = log
+    try:
+        source = None
+        if args.command == "retry-failed":
+            from deadLetter import FailedItems
+
+            # only this shard's dead letters; the other shards are writing theirs meanwhile
+            source = FailedItems(run_dir / shard_name(args.shard))
+        return run_batch(args, ResourceTypeMap.load(args.resource_types or DEFAULT_PATH), source)
+    except Exception as e:
+        print(f"shard failed: {type(e).__name__}: {e}", file=log)
+        return 1
+    finally:
+        log.close()
+
+
+def _shard_main(args: "ParsedArgs") -> None:
+    raise SystemExit(_run_shard(args))
+
+
+def run_workers(args: "ParsedArgs") -> int:
+    """Run ``args.workers`` shards of the batch as local processes, then merge their reports.
+
+    Each process is a ``run --shard i/N`` of the same run (new or resumed)
+    with its own journal, sessions and share of the rate limits; with
+    ``--metrics-port P`` shard i serves its metrics on port P + i. The DOI
+    index is brought up to date once here instead of in every shard.
+    """
+    count = args.workers
+    run_id = args.resume or RunJournal.create_run(args.run_directory)
+    run_dir = args.run_directory / run_id
+    print(f"run id: {run_id} ({count} shards, logs in {run_dir})", file=sys.stderr)
+    if args.metrics_port:
+        print(f"metrics: http://127.0.0.1:{args.metrics_port}-{args.metrics_port + count - 1}/metrics",
+              file=sys.stderr)
+    if args.index_path is not None and args.index_sync:
+        _sync_index(args)
+
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for index in range(count):
+        # one metrics server per process, so each shard needs a port of its own
+        port = args.metrics_port + index if args.metrics_port else 0
+        shard_args = replace(args, workers=0, shard=(index, count), resume=run_id, index_sync=False,
+                             metrics_port=port)
+        process = context.Process(target=_shard_main, args=(shard_args,), name=shard_name((index, count)))
+        process.start()
+        processes.append(process)
+    for process in processes:
+        process.join()
+
+    return report_shards(run_dir, count, [p.exitcode for p in processes])
+
+
+def _sync_index(args: "ParsedArgs") -> None:
+    from dataciteClient import DataCiteClient
+    from doiIndex import DoiIndex, sync_index
+    from getDataFromRepo import DSpaceSession
+
+    repo = DSpaceSession(args.repo_url, args.repo_user, args.repo_password)
+    datacite = DataCiteClient(args.datacite_base, args.datacite_token)
+    index = DoiIndex(args.index_path)
+    try:
+        repo.login()
+        sync_index(index, repo, datacite, args.prefix)
+    finally:
+        index.close()
+        datacite.close()
+        repo.close()
+
+
+def report_shards(run_dir, count: int, exit_codes: list[int | None]) -> int:
+    """Print each shard's summary and the run total; writes the total to ``<run>/metrics.json``."""
+    totals = dict.fromkeys(_TOTALS, 0)
+    shards = {}
+    for index, code in enumerate(exit_codes):
+        name = shard_name((index, count))
+        try:
+            summary = json.loads((run_dir / name / "metrics.json").read_text(encoding="utf-8"))["summary"]
+        except (OSError, ValueError, KeyError):
+            print(f"{name}: no report (exit code {code}, see {name}.log)", file=sys.stderr)
+            continue
+        shards[name] = summary | {"exit_code": code}
+        for key in _TOTALS:
+            totals[key] += summary.get(key, 0)
+        print(f"{name}: {summary['minted']} minted, {summary['failed']} failed, "
+              f"{summary['existing']} already had a DOI, {summary['skipped']} already done "
+              f"in {summary['elapsed_s']:.1f}s", file=sys.stderr)
+    (run_dir / "metrics.json").write_text(json.dumps({"summary": totals, "shards": shards}, indent=2),
+                                          encoding="utf-8")
+    print(f"{totals['minted']} minted, {totals['failed']} failed, {totals['existing']} already had a DOI, "
+          f"{totals['skipped']} already done")
+    if totals["failed"]:
+        print(f"retry the failed items with: python CLI.py retry-failed {run_dir.name}")
+    print(f"reminders: python CLI.py export-reminders {run_dir.name}")
+    return 0 if all(code == 0 for code in exit_codes) else 1
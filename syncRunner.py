@@ -0,0 +1,68 @@
+import sys
+from typing import TYPE_CHECKING
+
+from doiIndex import DoiIndex, solr_date
+from getDataFromRepo import OpenRepositoryClient
+from resourceTypes import ResourceTypeMap
+
+if TYPE_CHECKING:
+    from batchRunner import RunSummary
+    from CLI import ParsedArgs
+
+
+def new_items_query(since: str) -> str:
+    """Discovery query for items modified at or after ``since`` that have no DOI yet."""
+    return f"lastModified:[{solr_date(since)} TO *] AND -dc.identifier.doi:*"
+
+
+class NewItems:
+    """The items a ``sync`` run mints: no ``dc.identifier.doi``, modified since ``since``.
+
+    The list is read from discovery before minting starts, oldest first;
+    patching an item changes its DOI and ``lastModified``, which would shift
+    discovery's pages under a reader still paging through them. When the run
+    is over and its journal closed, :meth:`finish` moves the ``source``
+    watermark to the oldest failed item, so it is listed again next time, or
+    else to the newest item listed.
+    """
+
+    def __init__(self, index: DoiIndex, source: str, since: str):
+        self.index = index
+        self.source = source
+        self.since = since
+        self.modified: dict[str, str | None] = {}
+
+    def item_ids(self, repo: OpenRepositoryClient) -> list[str]:
+        for item in repo.search_items(new_items_query(self.since), sort="lastModified,ASC"):
+            self.modified[item["uuid"]] = item.get("lastModified")
+        print(f"{len(self.modified)} items without a DOI modified since {self.since}", file=sys.stderr)
+        return list(self.modified)
+
+    def watermark(self, failed: list[str]) -> str:
+        failed_at = [self.modified.get(item_id) for item_id in failed]
+        if None in failed_at:
+            return self.since
+        if failed_at:
+            return min(failed_at, key=solr_date)
+        return max((m for m in self.modified.values() if m), key=solr_date, default=self.since)
+
+    def finish(self, summary: "RunSummary") -> None:
+        watermark = self.watermark([result.item_id for result in summary.failed])
+        self.index.advance_watermark(self.source, watermark)
+        print(f"sync watermark: {self.index.watermark(self.source)}", file=sys.stderr)
+
+
+def run_sync(args: "ParsedArgs", resource_types: ResourceTypeMap) -> int:
+    """Mint DOIs for the items deposited or changed since the last sync (or ``--since``)."""
+    from batchRunner import run_batch
+
+    index = DoiIndex(args.run_directory / "doi_index.sqlite3")
+    source = f"sync:{args.repo_url}"
+    try:
+        since = index.watermark(source) if args.since == "last" else args.since
+        if since is None:
+            print(f"No sync watermark for {args.repo_url} yet; start with --since TIMESTAMP", file=sys.stderr)
+            return 2
+        return run_batch(args, resource_types, NewItems(index, source, since))
+    finally:
+        index.close()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the modules live flat at the repository root, as CLI.py and the benchmarks import them
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
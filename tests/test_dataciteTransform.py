@@ -0,0 +1,98 @@
+import pytest
+
+from dataciteTransform import handle_url, item_doi, pair_orcids
+
+A, B, C = "0000-0001-0000-0001", "0000-0002-0000-0002", "0000-0003-0000-000X"
+
+
+def _field(*pairs: tuple[str, str | None]) -> list[dict]:
+    # ("value", "authority") pairs in place order, shaped like DSpace metadata values
+    return [{"value": v, "language": None, "authority": a, "confidence": -1, "place": i}
+            for i, (v, a) in enumerate(pairs)]
+
+
+def _item(authors: list[tuple[str, str | None]], orcids: list[tuple[str, str | None]]) -> dict:
+    metadata = {"dc.contributor.author": _field(*authors)}
+    if orcids:
+        metadata["dc.identifier.orcid"] = _field(*orcids)
+    return metadata
+
+
+def _linked(orcid: str) -> str:
+    return f"will be referenced::ORCID::{orcid}"
+
+
+def test_author_authority_orcid_wherever_it_is_listed():
+    metadata = _item([("Doe, J", None), ("Roe, R", _linked(B))], [(B, None)])
+    assert pair_orcids(metadata) == ({1: B}, [])
+
+
+def test_orcid_sharing_an_authors_authority():
+    metadata = _item([("Doe, J", "a-1"), ("Roe, R", "a-2")], [(B, "a-2")])
+    assert pair_orcids(metadata) == ({1: B}, [])
+
+
+def test_one_orcid_per_author_pairs_by_place():
+    metadata = _item([("Doe, J", None), ("Roe, R", None)], [(A, None), (B, None)])
+    assert pair_orcids(metadata) == ({0: A, 1: B}, [])
+
+
+def test_place_order_wins_over_list_order():
+    metadata = _item([("Doe, J", None), ("Roe, R", None)], [(A, None), (B, None)])
+    metadata["dc.contributor.author"].reverse()
+    metadata["dc.identifier.orcid"].reverse()
+    assert pair_orcids(metadata) == ({0: A, 1: B}, [])
+
+
+def test_place_pairing_after_authority_pairing():
+    metadata = _item([("Doe, J", None), ("Roe, R", _linked(A))], [(B, None), (A, None)])
+    assert pair_orcids(metadata) == ({0: B, 1: A}, [])
+
+
+def test_sole_author_takes_first_orcid_only():
+    metadata = _item([("Doe, J", None)], [(A, None), (B, None)])
+    assert pair_orcids(metadata) == ({0: A}, [B])
+
+
+def test_sole_author_with_authority_orcid_keeps_it():
+    metadata = _item([("Doe, J", _linked(A))], [(B, None)])
+    assert pair_orcids(metadata) == ({0: A}, [B])
+
+
+@pytest.mark.parametrize("authors, orcids, expected", [
+    # fewer ORCIDs than authors: nothing says whose they are
+    ([("Doe, J", None), ("Roe, R", None), ("Poe, P", None)], [(A, None), (B, None)], ({}, [A, B])),
+    ([("Doe, J", None), ("Roe, R", None)], [(B, None)], ({}, [B])),
+    # an authority link settles one author; the leftover still cannot be placed
+    ([("Doe, J", _linked(A)), ("Roe, R", None), ("Poe, P", None)], [(A, None), (C, None)], ({0: A}, [C])),
+    # an ORCID authority no author shares
+    ([("Doe, J", "a-1"), ("Roe, R", None)], [(B, "a-9")], ({}, [B])),
+])
+def test_partial_coverage_stays_unmatched(authors, orcids, expected):
+    assert pair_orcids(_item(authors, orcids)) == expected
+
+
+def test_no_orcids():
+    assert pair_orcids(_item([("Doe, J", None)], [])) == ({}, [])
+
+
+def test_item_doi_is_stable():
+    doi = item_doi("10.80000", "3f2504e0-4f89-11d3-9a0c-0305e82c3301")
+    # a changed derivation would mint a second DOI for items retried or resumed across versions
+    assert doi == "10.80000/t6zt-yjqz-cmyb"
+    assert item_doi("10.80000", "3F2504E0-4F89-11D3-9A0C-0305E82C3301") == doi
+    assert item_doi("10.80000", "3f2504e0-4f89-11d3-9a0c-0305e82c3302") != doi
+
+
+@pytest.mark.parametrize("uri", [
+    "http://hdl.handle.net/20.500.14038/123",
+    "https://hdl.handle.net/20.500.14038/123?locatt=view:master",
+    "https://scholarworks.umass.edu/handle/20.500.14038/123",
+])
+def test_handle_url_accepts_both_uri_forms(uri):
+    assert handle_url("https://repository.example/", uri) == "https://repository.example/handle/20.500.14038/123"
+
+
+def test_handle_url_rejects_other_uris():
+    with pytest.raises(KeyError):
+        handle_url("https://repository.example", "http://hdl.handle.net/20.500.14038")
@@ -0,0 +1,64 @@
+import httpx
+import pytest
+
+from rateLimit import RateLimiters, RetryBudget, RetryScheduler
+
+
+def _status_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", "https://api.datacite.org/dois/10.80000/abcd")
+    return httpx.HTTPStatusError(str(status), request=request, response=httpx.Response(status, request=request))
+
+
+def _scheduler(retry_count: int = 3, budget: RetryBudget | None = None) -> RetryScheduler:
+    return RetryScheduler(RateLimiters(), retry_count, budget or RetryBudget(minimum=100))
+
+
+@pytest.mark.parametrize("error", [
+    _status_error(429),
+    _status_error(503),
+    _status_error(504),
+    httpx.ConnectError("refused"),
+    httpx.ReadTimeout("slow"),
+])
+def test_transient_errors_are_retried(error):
+    assert _scheduler().can_retry(error, 0)
+
+
+@pytest.mark.parametrize("error", [
+    _status_error(400),
+    _status_error(404),
+    _status_error(422),
+    ValueError("bad payload"),
+])
+def test_other_errors_are_not_retried(error):
+    assert not _scheduler().can_retry(error, 0)
+
+
+def test_retries_stop_at_retry_count():
+    scheduler = _scheduler(retry_count=2)
+    assert scheduler.can_retry(_status_error(503), 1)
+    assert not scheduler.can_retry(_status_error(503), 2)
+
+
+def test_budget_caps_retries_and_grows_with_requests():
+    budget = RetryBudget(ratio=0.5, minimum=2)
+    scheduler = _scheduler(budget=budget)
+    assert [scheduler.can_retry(_status_error(503), 0) for _ in range(3)] == [True, True, False]
+    for _ in range(2):
+        scheduler.call("datacite", lambda: None)
+    assert scheduler.can_retry(_status_error(503), 0)
+    assert not scheduler.can_retry(_status_error(503), 0)
+
+
+def test_refused_retries_spend_no_budget():
+    budget = RetryBudget(ratio=0.0, minimum=1)
+    scheduler = _scheduler(budget=budget)
+    assert not scheduler.can_retry(_status_error(404), 0)
+    assert scheduler.can_retry(_status_error(503), 0)
+
+
+def test_services_keep_their_own_limiters():
+    limiters = RateLimiters({"datacite": 5.0, "dspace": 0.0})
+    assert limiters["datacite"] is not limiters["dspace"]
+    assert limiters["datacite"].rate == 5.0
+    assert limiters["dspace"].rate == 0.0
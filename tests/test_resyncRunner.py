@@ -0,0 +1,33 @@
+from resyncRunner import matches
+
+
+def test_extra_fields_datacite_adds_still_match():
+    wanted = {"creators": [{"name": "Doe, J", "affiliation": [{"name": "UMass Amherst"}]}]}
+    current = {
+        "creators": [{"name": "Doe, J", "affiliation": [{"name": "UMass Amherst", "affiliationIdentifierScheme": "ROR"}]}],
+        "schemaOrg": "{}",
+    }
+    assert matches(wanted, current)
+
+
+def test_blanks_equal_missing_values():
+    assert matches({"givenName": "", "familyName": None}, {})
+    assert not matches({"givenName": ""}, {"givenName": "J"})
+
+
+def test_publication_year_compares_as_text():
+    assert matches({"publicationYear": "2024"}, {"publicationYear": 2024})
+    assert not matches({"publicationYear": "2024"}, {"publicationYear": 2023})
+
+
+def test_lists_match_item_by_item():
+    wanted = {"titles": [{"title": "A"}, {"title": "B"}]}
+    assert matches(wanted, {"titles": [{"title": "A"}, {"title": "B"}]})
+    assert not matches(wanted, {"titles": [{"title": "B"}, {"title": "A"}]})
+    assert not matches(wanted, {"titles": [{"title": "A"}]})
+    assert not matches(wanted, {"titles": [{"title": "A"}, {"title": "B"}, {"title": "C"}]})
+
+
+def test_changed_or_missing_value_differs():
+    assert not matches({"url": "https://repository.example/handle/1/2"}, {"url": "https://old.example/handle/1/2"})
+    assert not matches({"subjects": [{"subject": "x"}]}, {})
@@ -0,0 +1,40 @@
+from runJournal import ItemState, RunJournal
+
+
+def test_reload_keeps_the_furthest_stage(tmp_path):
+    journal = RunJournal.open(tmp_path)
+    run_id = journal.run_id
+    journal.record("a", "fetched")
+    journal.record("a", "minted", doi="10.80000/abcd", url="https://repository.example/handle/1/2", durable=True)
+    journal.record("a", "transformed")
+    journal.record("b", "fetched")
+    journal.close()
+
+    reopened = RunJournal.open(tmp_path, run_id)
+    assert reopened.get("a") == ItemState("minted", "10.80000/abcd", "https://repository.example/handle/1/2")
+    assert reopened.get("b") == ItemState("fetched")
+    reopened.record("a", "patched")
+    reopened.close()
+    assert RunJournal.read(tmp_path / run_id)["a"] == ItemState("patched", "10.80000/abcd",
+                                                              "https://repository.example/handle/1/2")
+
+
+def test_torn_last_line_is_skipped_and_terminated(tmp_path):
+    journal = RunJournal.open(tmp_path)
+    run_id = journal.run_id
+    journal.record("a", "minted", doi="10.80000/abcd", durable=True)
+    journal.close()
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"item": "b", "stage": "min')
+
+    reopened = RunJournal.open(tmp_path, run_id)
+    assert reopened.get("a").doi == "10.80000/abcd"
+    assert reopened.get("b") is None
+    reopened.record("b", "patched", durable=True)
+    reopened.close()
+    assert RunJournal.read(tmp_path / run_id)["b"].stage == "patched"
+
+
+def test_runs_started_together_get_distinct_ids(tmp_path):
+    ids = {RunJournal.create_run(tmp_path) for _ in range(3)}
+    assert len(ids) == 3